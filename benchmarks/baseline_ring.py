@@ -0,0 +1,192 @@
+'''
+Frozen copy of the ring detection of `helper` as first shipped (`check_ring` and the functions
+it calls), kept unchanged as the reference of `benchmarks.verify_rings`, so that later changes
+of `helper` are compared against the original behaviour and not against themselves.
+'''
+import numpy as np
+from typing import List, Tuple
+
+
+def is_valid(x, y, dims):
+    '''
+    Returns whether the coordinates are valid or not
+
+    # Parameters
+    `x (int)`: x-coordinate
+    `y (int)`: y-coordinate
+    `dims (int)`: Dimension of the board
+
+    # Returns
+    bool: True if the coordinates lie inside the board, False otherwise
+    '''
+    return 0 <= x < dims and 0 <= y < dims
+
+def get_neighbours(dim: int, vertex: Tuple[int, int]) -> List[Tuple[int, int]]:
+    '''
+    Returns the neighbours of the vertex on the board
+    
+    # Parameters
+    dim (int): Dimension of the board
+    vertex (Tuple[int, int]): Coordinates of the point whose virtual neighbors are to be found
+
+    # Returns
+    List[List[Tuple[int, int]]]: List of list of tuples, where each list contains 3 vertices.
+        - First tuple in each list is a virtual neighbour of the "vertex"
+        - Second and Third tuples in each list are common neighbours of the "vertex" and the virtual neighbour
+    '''
+    i, j = vertex
+    siz = dim//2
+    neighbours = []
+    if i > 0:
+        neighbours.append((i - 1, j))
+    if i < dim - 1:
+        neighbours.append((i + 1, j))
+    if j > 0:
+        neighbours.append((i, j - 1))
+    if j < dim - 1:
+        neighbours.append((i, j + 1))
+    if i > 0 and j <= siz and j > 0:
+        neighbours.append((i - 1, j - 1))
+    if i > 0 and j >= siz and j < dim - 1:
+        neighbours.append((i - 1, j + 1))
+    if j < siz and i < dim - 1:
+        neighbours.append((i + 1, j + 1))
+    if j > siz and i < dim - 1:
+        neighbours.append((i + 1, j - 1))
+    return neighbours
+
+
+def move_coordinates(direction: str, half: int) -> Tuple[int, int]:
+    '''
+    Returns the coordinates of the move in the given direction
+    
+    # Parameters
+    `direction (str)`: The direction to which the move is to be made
+    `half (int)`: The half of the board from which the move is to be made.
+        - half = 0 => mid-line
+        - half < 0 => left half
+        - half > 0 => right half
+
+    # Returns
+    Tuple[int, int]: Coordinates of the move in the given direction
+    '''
+    if direction == "up":
+        return (-1, 0)
+    elif direction == "down":
+        return (1, 0)
+    elif direction == "top-left":
+        if half == 0:
+            return (-1, -1)
+        elif half < 0:
+            return (-1, -1)
+        elif half > 0:
+            return (0, -1)
+    elif direction == "top-right":
+        if half == 0:
+            return (-1, 1)
+        elif half < 0:
+            return (0, 1)
+        elif half > 0:
+            return (-1, 1)
+    elif direction == "bottom-left":
+        if half == 0:
+            return (0, -1)
+        elif half < 0:
+            return (0, -1)
+        elif half > 0:
+            return (1, -1)
+    elif direction == "bottom-right":
+        if half == 0:
+            return (0, 1)
+        elif half < 0:
+            return (1, 1)
+        elif half > 0:
+            return (0, 1)
+
+    return None
+
+
+def three_forward_moves(direction: str) -> List[str]:
+    '''
+    Returns the 3 forward moves from the current direction
+    
+    # Parameters
+    direction (str): The direction of the last move
+
+    # Returns
+    List[str]: List of 3 forward moves from the current direction
+    '''
+    if direction == "up":
+        return ["top-left", "up", "top-right"]
+    if direction == "down":
+        return ["down", "bottom-left", "bottom-right"]
+    if direction == "top-left":
+        return ["bottom-left", "top-left", "up"]
+    if direction == "top-right":
+        return ["top-right", "up", "bottom-right"]
+    if direction == "bottom-left":
+        return ["bottom-left", "down", "top-left"]
+    if direction == "bottom-right":
+        return ["bottom-right", "down", "top-right"]
+    return None
+
+
+
+
+def check_ring(board: np.array, move: Tuple[int, int]) -> bool:
+    '''
+    Check whether a ring is formed by the move
+    
+    # Parameters
+    board (numpy array[bool]): game board with True values at the positions of the player and False elsewhere
+    move (Tuple[int, int]): position of the move. Must have already been played (marked on the board)
+
+    # Returns
+    bool: True if a ring is formed by the move, False otherwise
+    '''
+    # board is already a numpy boolean array, we are only concerned with "true" paths
+    # DFS at <move> to check whether ring forms
+    dim = board.shape[0]  # of the array
+    siz = dim // 2  # to determine the half of the board
+    init_move = move
+    directions = ["up", "top-left", "bottom-left", "down"]
+    visited = set()
+
+    # Trivially false if less than 2 True neighbours present
+    neighbours = get_neighbours(dim, move)
+    neighbours = [board[neighbour] for neighbour in neighbours]
+    if neighbours.count(True) < 2:
+        return False
+
+    # In the first step, move in 4 contiguous directions (4 suffices to detect a ring)
+    exploration = []
+    for direction in directions:
+        x, y = move
+        half = np.sign(move[1] - siz)  # 0 for mid, -1 for left, 1 for right
+        direction_coors = move_coordinates(direction, half)
+        nx, ny = x + direction_coors[0], y + direction_coors[1]
+        if 0 <= nx < dim and 0 <= ny < dim and board[nx, ny]:
+            exploration.append(((nx, ny), direction))
+            visited.add((nx, ny, direction))
+
+    ring_length = 1
+    # In the later steps, move in 3 "forward" directions (avoids sharp turns)
+    while (len(exploration) != 0):
+        new_exp = []
+        for to_explore in exploration:
+            move, prev_direction = to_explore
+            x, y = move
+            half = np.sign(y - siz)
+            new_directions = three_forward_moves(prev_direction)
+            for direction in new_directions:
+                direction_coors = move_coordinates(direction, half)
+                nx, ny = x + direction_coors[0], y + direction_coors[1]
+                if is_valid(nx, ny, dim) and board[nx, ny] and (nx, ny, direction) not in visited:
+                    if init_move == (nx, ny) and ring_length >= 5:
+                        # print(f"Ring passing through {init_move} detected!")
+                        return True
+                    new_exp.append(((nx, ny), direction))
+                    visited.add((nx, ny, direction))
+        exploration = new_exp
+        ring_length += 1
+    return False
@@ -0,0 +1,67 @@
+'''
+Strength of the full AMAF statistics (every move of the playouts) against RAVE on the tree
+moves only: the full AMAF agent with `--iterations` iterations per move plays against the
+tree-only agent with 1, 2, 4... times as many. The budget ratio at which the full AMAF agent
+stops winning most games is the number of playouts it saves.
+
+Usage: python -m benchmarks.bench_amaf [--layers 4] [--iterations 100] [--ratios 1 2 4] [--games 20]
+'''
+import math
+import random
+import argparse
+import numpy as np
+
+from helper import ConnectivityTracker
+from players.ai import Tree, search, immediate_move, beta_func
+from benchmarks.positions import empty_board
+
+
+def choose(state: np.array, player_num: int, iterations: int, full_amaf: bool) -> tuple:
+    '''
+    Move of the ai agent after a search of `iterations` iterations
+    '''
+    move = immediate_move(state, player_num)
+    if move is not None:
+        return move
+    tree = Tree(state, player_num, full_amaf=full_amaf)
+    search(tree, math.inf, target_depth=2**32-1, num_rollouts=10, iterations=iterations)
+    return tree.coords(tree.move[tree.best_child(0, c=0.9, beta_func=beta_func)])
+
+
+def play(layers: int, budgets: dict, first: bool) -> bool:
+    '''
+    Plays one game, returns whether the full AMAF agent won. `budgets` maps full_amaf to the iterations per move.
+    '''
+    state = empty_board(layers)
+    tracker = ConnectivityTracker(state)
+    amaf_player = 1 if first else 2
+    player = 1
+    while (state == 0).any():
+        move = choose(state, player, budgets[player == amaf_player], player == amaf_player)
+        state[move] = player
+        tracker.play(move, player)
+        if tracker.check_win(move, player)[0]:
+            return player == amaf_player
+        player = 3 - player
+    return False
+
+
+def main(layers: int, iterations: int, ratios: list, games: int, seed: int):
+    random.seed(seed)
+    np.random.seed(seed)
+    print('full AMAF with {} iterations per move, {} games per ratio, board of {} layers'.format(iterations, games, layers))
+    for ratio in ratios:
+        budgets = {True: iterations, False: iterations * ratio}
+        wins = sum(play(layers, budgets, game % 2 == 0) for game in range(games))
+        print('tree-only RAVE with {:>2}x the iterations: full AMAF wins {:.2f}'.format(ratio, wins / games))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--ratios', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    main(args.layers, args.iterations, args.ratios, args.games, args.seed)
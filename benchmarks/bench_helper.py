@@ -0,0 +1,145 @@
+'''
+Throughput of the win-detection primitives of `helper`: `check_win`, `check_ring`,
+`check_fork_and_bridge`, `bfs_reachable`, `get_valid_actions` and `get_neighbours`.
+
+Every primitive is timed on seeded corpora of random positions for each board size and game
+phase (sparse, mid-game, near-full), optionally with blocked cells. The calls are made on the
+last move of every position. Results are reported as operations per second and percentiles of
+the call duration, can be saved as JSON, and compared against a saved baseline: a case whose
+throughput dropped by more than the threshold is a regression, and makes the exit status 1.
+
+Usage: python -m benchmarks.bench_helper [--layers 3 12] [--positions 20] [--rounds 5] [--blocks 0]
+           [--seed 0] [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+'''
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import numpy as np
+from typing import Callable, Dict, List, Tuple
+
+from helper import check_win, check_ring, check_fork_and_bridge, bfs_reachable, get_valid_actions, get_neighbours
+from benchmarks.positions import random_position
+
+# Fraction of the free cells taken in every game phase
+PHASES = {'sparse': 0.1, 'mid': 0.4, 'full': 0.85}
+
+# Call of every primitive on a position: (board, boolean board of the last mover, last move, last mover)
+PRIMITIVES = {
+    'check_win': lambda board, own, move, player: check_win(board, move, player),
+    'check_ring': lambda board, own, move, player: check_ring(own, move),
+    'check_fork_and_bridge': lambda board, own, move, player: check_fork_and_bridge(own, move),
+    'bfs_reachable': lambda board, own, move, player: bfs_reachable(own, move),
+    'get_valid_actions': lambda board, own, move, player: get_valid_actions(board),
+    'get_neighbours': lambda board, own, move, player: get_neighbours(board.shape[0], move),
+}
+
+
+def corpus(layers: int, fill: float, positions: int, blocks: int, rng: random.Random) -> List[Tuple[np.array, np.array, Tuple[int, int], int]]:
+    '''
+    Generates the positions of one board size and phase, with at least one move played
+
+    # Returns
+    List[Tuple[np.array, np.array, Tuple[int, int], int]]: Board, boolean board of the last mover,
+        last move and last mover of every position
+    '''
+    cases = []
+    while len(cases) < positions:
+        board, moves = random_position(layers, fill, rng, blocks)
+        if not moves:
+            fill = 1 / max(int((board == 0).sum()), 1)
+            continue
+        player = 2 - len(moves) % 2
+        cases.append((board, board == player, moves[-1], player))
+    return cases
+
+
+def measure(function: Callable, cases: list, rounds: int) -> Dict[str, float]:
+    '''
+    Calls `function` on every case `rounds` times, after one untimed call per case that builds the
+    tables cached per board size (geometry, bit masks), so that they do not count as a slow call
+
+    # Returns
+    Dict[str, float]: Operations per second, and the 50th, 90th and 99th percentiles of a call in microseconds
+    '''
+    for case in cases:
+        function(*case)
+    durations = []
+    for _ in range(rounds):
+        for case in cases:
+            start = time.perf_counter()
+            function(*case)
+            durations.append(time.perf_counter() - start)
+    durations = np.array(durations)
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99]) * 1e6
+    return {'ops_per_sec': round(len(durations) / durations.sum(), 1),
+            'p50_us': round(float(p50), 3), 'p90_us': round(float(p90), 3), 'p99_us': round(float(p99), 3),
+            'calls': len(durations)}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    '''
+    Prints the change of throughput of every case present in both runs
+
+    # Returns
+    List[str]: Cases whose throughput dropped by more than `threshold` (a fraction)
+    '''
+    regressions = []
+    print('\n{:<45} {:>14} {:>14} {:>8}'.format('case', 'baseline op/s', 'current op/s', 'change'))
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        before, after = baseline[case]['ops_per_sec'], result['ops_per_sec']
+        change = after / before - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(case)
+            flag = '  REGRESSION'
+        print('{:<45} {:>14.1f} {:>14.1f} {:>+7.1%}{}'.format(case, before, after, change, flag))
+    return regressions
+
+
+def main(first: int, last: int, positions: int, rounds: int, blocks: int, seed: int,
+         output: str, baseline: str, threshold: float) -> int:
+    rng = random.Random(seed)
+    results = {}
+    print('{:<45} {:>12} {:>10} {:>10} {:>10}'.format('case', 'op/s', 'p50 (us)', 'p90 (us)', 'p99 (us)'))
+    for layers in range(first, last + 1):
+        for phase, fill in PHASES.items():
+            cases = corpus(layers, fill, positions, blocks, rng)
+            for name, function in PRIMITIVES.items():
+                case = '{}/layers={}/{}'.format(name, layers, phase)
+                results[case] = measure(function, cases, rounds)
+                print('{:<45} {:>12.1f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                    case, results[case]['ops_per_sec'], results[case]['p50_us'], results[case]['p90_us'], results[case]['p99_us']))
+
+    if output:
+        meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'layers': [first, last], 'positions': positions, 'rounds': rounds, 'blocks': blocks, 'seed': seed}
+        with open(output, 'w') as file:
+            json.dump({'meta': meta, 'results': results}, file, indent=1)
+        print('\nresults written to {}'.format(output))
+
+    if baseline:
+        with open(baseline) as file:
+            regressions = compare(results, json.load(file)['results'], threshold)
+        print('\n{} regression(s) beyond {:.0%}'.format(len(regressions), threshold))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, nargs=2, default=[3, 12])
+    parser.add_argument('--positions', type=int, default=20, help='Positions per board size and phase')
+    parser.add_argument('--rounds', type=int, default=5, help='Calls per position')
+    parser.add_argument('--blocks', type=int, default=0, help='Random blocked cells on every board')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help='JSON file to save the results to')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON file of earlier results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Largest tolerated drop of throughput, as a fraction')
+    args = parser.parse_args()
+    sys.exit(main(args.layers[0], args.layers[1], args.positions, args.rounds, args.blocks, args.seed,
+                  args.output, args.baseline, args.threshold))
@@ -0,0 +1,117 @@
+'''
+End-to-end throughput of the searches of the agents: `players.ai.mcts` and `players.ai2.mcts`
+on every start position of `initial_states/`, and on generated boards of larger sizes.
+
+Every agent searches every position once with a fixed number of playouts and once with a fixed
+wall-clock budget, with fixed seeds. Each search runs in a fresh process, so that its peak
+resident memory is its own and the global tables of `ai2` start empty. Reports the playouts per
+second, the nodes allocated, the peak RSS and the chosen move.
+
+Usage: python -m benchmarks.bench_mcts [--playouts 2000] [--time 2] [--layers 10 12] [--blocks 12]
+           [--agents ai ai2] [--seed 0] [--output results.json]
+'''
+import os
+import glob
+import json
+import math
+import random
+import argparse
+import resource
+import platform
+import multiprocessing
+import numpy as np
+from typing import Dict, List, Tuple
+
+from instrumentation import SearchStats
+from benchmarks.positions import random_board
+
+INITIAL_STATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'initial_states')
+
+
+def positions(layers: List[int], blocks: int, seed: int) -> List[Tuple[str, np.array]]:
+    '''
+    Returns the shipped start positions, then a generated board for each of `layers`
+
+    # Returns
+    List[Tuple[str, np.array]]: Name and board of every position
+    '''
+    boards = [(os.path.basename(path), np.loadtxt(path, dtype=int, ndmin=2))
+              for path in sorted(glob.glob(os.path.join(INITIAL_STATES, '*.txt')))]
+    rng = random.Random(seed)
+    boards += [('generated{}'.format(size), random_board(size, blocks, rng)) for size in layers]
+    return boards
+
+
+def run(agent: str, board: np.array, seconds: float, iterations: int, num_rollouts: int, seed: int) -> Dict:
+    '''
+    Runs one search of player 1, in the calling process, and measures it
+
+    # Parameters
+    `agent (str)`: 'ai' or 'ai2'
+    `seconds (float)`: Time budget, unlimited if `math.inf`
+    `iterations (int)`: Budget of iterations, unlimited if None
+
+    # Returns
+    Dict: Playouts, playouts per second, nodes, peak RSS in MB and move of the search
+    '''
+    random.seed(seed)
+    np.random.seed(seed)
+    stats = SearchStats()
+    if agent == 'ai':
+        from players.ai import Tree, mcts
+        tree = Tree(board, 1)
+        move = mcts(board, seconds, 1, target_depth=2**32-1, num_rollouts=num_rollouts, tree=tree,
+                    stats=stats, iterations=iterations)
+        nodes = tree.size
+    else:
+        from players.ai2 import mcts
+        move = mcts(board, seconds, 1, target_depth=2**32-1, num_rollouts=num_rollouts, stats=stats, iterations=iterations)
+        nodes = stats.fields.get('tree_size', 0)
+    record = stats.record()
+    return {'playouts': record['playouts'], 'elapsed': record['elapsed'], 'playouts_per_sec': record['playouts_per_sec'],
+            'nodes': int(nodes), 'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'move': [int(move[0]), int(move[1])]}
+
+
+def isolated(*args) -> Dict:
+    '''
+    Runs `run(*args)` in a new process, returns its result
+    '''
+    with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(run, args)
+
+
+def main(agents: List[str], playouts: int, seconds: float, layers: List[int], blocks: int, num_rollouts: int, seed: int, output: str):
+    results = {}
+    print('{:<16} {:<5} {:<10} {:>9} {:>12} {:>8} {:>9} {:>8}'.format(
+        'position', 'agent', 'budget', 'playouts', 'playout/s', 'nodes', 'RSS (MB)', 'move'))
+    for name, board in positions(layers, blocks, seed):
+        for agent in agents:
+            budgets = {'{}p'.format(playouts): (math.inf, max(playouts // num_rollouts, 1)), '{}s'.format(seconds): (seconds, None)}
+            for budget, (limit, iterations) in budgets.items():
+                result = isolated(agent, board, limit, iterations, num_rollouts, seed)
+                results['{}/{}/{}'.format(agent, name, budget)] = result
+                print('{:<16} {:<5} {:<10} {:>9} {:>12.1f} {:>8} {:>9.1f} {:>8}'.format(
+                    name, agent, budget, result['playouts'], result['playouts_per_sec'], result['nodes'],
+                    result['peak_rss_mb'], '{},{}'.format(*result['move'])), flush=True)
+
+    if output:
+        meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+                'playouts': playouts, 'time': seconds, 'rollouts': num_rollouts, 'layers': layers, 'blocks': blocks, 'seed': seed}
+        with open(output, 'w') as file:
+            json.dump({'meta': meta, 'results': results}, file, indent=1)
+        print('\nresults written to {}'.format(output))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--agents', type=str, nargs='+', default=['ai', 'ai2'], choices=['ai', 'ai2'])
+    parser.add_argument('--playouts', type=int, default=2000, help='Playouts of the fixed-count searches')
+    parser.add_argument('--time', type=float, default=2, help='Seconds of the fixed-time searches')
+    parser.add_argument('--layers', type=int, nargs='*', default=[10, 12], help='Sizes of the generated boards')
+    parser.add_argument('--blocks', type=int, default=12, help='Random blocked cells on the generated boards')
+    parser.add_argument('--rollouts', type=int, default=10, help='Playouts per iteration')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default=None, help='JSON file to save the results to')
+    args = parser.parse_args()
+    main(args.agents, args.playouts, args.time, args.layers, args.blocks, args.rollouts, args.seed, args.output)
@@ -0,0 +1,53 @@
+'''
+Scaling of the parallel searches of the ai agent: playouts per second of the shared tree
+(tree parallelisation with virtual loss) and of the independent trees (root parallelisation)
+for an increasing number of workers, from the empty board of 6 layers. The speedups are only
+meaningful up to the number of cores; `--start_method spawn` checks the searches of workers that
+are not forked.
+
+Usage: python -m benchmarks.bench_parallel [--layers 6] [--workers 1 2 4 8] [--time 5] [--start_method spawn]
+'''
+import os
+import argparse
+import multiprocessing as mp
+
+from players.ai import SearchPool, TreeParallelPool
+from benchmarks.positions import empty_board
+
+
+def playouts_per_second(pool, board, seconds: float, num_rollouts: int) -> float:
+    '''
+    Runs one search of `seconds` seconds on `pool`, returns the number of playouts per second
+    '''
+    pool.search(board, timer_per_move=seconds, target_depth=2**32-1, num_rollouts=num_rollouts)
+    return pool.iterations * num_rollouts / seconds
+
+
+def main(layers: int, workers: list, seconds: float, num_rollouts: int):
+    board = empty_board(layers)
+    print('{} cores available, board of {} layers, workers started by {}'.format(os.cpu_count(), layers, mp.get_start_method()))
+    print('{:>8} {:>16} {:>8} {:>16} {:>8}'.format('workers', 'tree (playout/s)', 'speedup', 'root (playout/s)', 'speedup'))
+    base = None
+    for count in workers:
+        rates = []
+        for pool in (TreeParallelPool(1, count, board.shape[0]), SearchPool(1, count)):
+            # Warm up the workers (imports, geometry tables) before measuring
+            pool.search(board, timer_per_move=0.1, target_depth=2**32-1, num_rollouts=num_rollouts)
+            rates.append(playouts_per_second(pool, board, seconds, num_rollouts))
+            pool.close()
+        base = base or rates
+        note = '  (more workers than cores)' if count > os.cpu_count() else ''
+        print('{:>8} {:>16.0f} {:>8.2f} {:>16.0f} {:>8.2f}{}'.format(count, rates[0], rates[0] / base[0], rates[1], rates[1] / base[1], note))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, default=6)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--time', type=float, default=5)
+    parser.add_argument('--rollouts', type=int, default=10)
+    parser.add_argument('--start_method', type=str, default=None, choices=['fork', 'spawn', 'forkserver'], help='Start method of the workers, the platform default if not set')
+    args = parser.parse_args()
+    if args.start_method:
+        mp.set_start_method(args.start_method, force=True)
+    main(args.layers, args.workers, args.time, args.rollouts)
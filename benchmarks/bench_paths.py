@@ -0,0 +1,48 @@
+'''
+Scaling of the winning path extraction: times `helper.check_win` with and without a path on
+snake boards (one chain covering about half of the board), from 4 up to 20 layers
+(board arrays of 7x7 up to 39x39) by default.
+
+Usage: python -m benchmarks.bench_paths [--layers 4 20] [--repeat 50]
+'''
+import time
+import argparse
+import numpy as np
+
+from helper import check_win
+from benchmarks.positions import snake_board
+
+
+def timed(func, repeat: int) -> float:
+    '''
+    Returns the median duration of `func()` over `repeat` calls, in microseconds
+    '''
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations)) * 1e6
+
+
+def main(first: int, last: int, repeat: int):
+    print('{:>6} {:>6} {:>8} {:>12} {:>12} {:>10} {:>8}'.format(
+        'layers', 'dim', 'chain', 'detect (us)', 'path (us)', 'us/cell', 'length'))
+    for layers in range(first, last + 1):
+        board, move = snake_board(layers)
+        chain = int((board == 1).sum())
+        path = []
+        win, way = check_win(board, move, 1, path)
+        assert win, 'snake board of {} layers is not a win'.format(layers)
+        detect = timed(lambda: check_win(board, move, 1), repeat)
+        extract = timed(lambda: check_win(board, move, 1, []), repeat)
+        print('{:>6} {:>6} {:>8} {:>12.1f} {:>12.1f} {:>10.3f} {:>8}'.format(
+            layers, board.shape[0], chain, detect, extract, extract / chain, '{} {}'.format(len(path), way)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, nargs=2, default=[4, 20])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    main(args.layers[0], args.layers[1], args.repeat)
@@ -0,0 +1,87 @@
+'''
+Random playouts: the move-by-move rollout (`get_valid_actions` and `check_win` after every
+move), the fill-and-replay engine `ConnectivityTracker.playout`, and the batched NumPy playouts
+of `players.ai.batch_playout` (`--batch` games per call).
+Reports the time per playout, and the outcome distributions to check they agree.
+
+Usage: python -m benchmarks.bench_playout [--layers 4 6 8 10] [--samples 300] [--fill 0.1]
+'''
+import time
+import random
+import argparse
+import numpy as np
+
+from helper import get_valid_actions, check_win, ConnectivityTracker
+from players.ai import batch_playout
+from benchmarks.positions import random_position
+
+
+def stepwise_playout(board: np.array, player_num: int, rng: random.Random):
+    '''
+    Reference playout, one move at a time on the numpy board
+    '''
+    state = board.copy()
+    player = player_num
+    length = 0
+    while True:
+        moves = get_valid_actions(state)
+        if not moves:
+            return 0, length
+        move = rng.choice(moves)
+        state[move] = player
+        length += 1
+        # Only the player who just moved can have completed a structure
+        if check_win(state, move, player)[0]:
+            return player, length
+        player = 3 - player
+
+
+def summary(results) -> str:
+    '''
+    Win rates of both players, draw rate and mean game length
+    '''
+    winners = np.array([winner for winner, _ in results])
+    lengths = np.array([length for _, length in results])
+    return 'p1 {:.3f}  p2 {:.3f}  draw {:.3f}  length {:6.1f}'.format(
+        (winners == 1).mean(), (winners == 2).mean(), (winners == 0).mean(), lengths.mean())
+
+
+def main(layers_list: list, samples: int, fill: float, seed: int, batch: int):
+    for layers in layers_list:
+        rng = random.Random(seed)
+        board, moves = random_position(layers, fill, rng)
+        player = 1 + len(moves) % 2
+        tracker = ConnectivityTracker(board)
+
+        start = time.perf_counter()
+        reference = [stepwise_playout(board, player, rng) for _ in range(samples)]
+        reference_time = (time.perf_counter() - start) / samples
+
+        start = time.perf_counter()
+        engine = [tracker.playout(player, rng) for _ in range(samples * 10)]
+        engine_time = (time.perf_counter() - start) / (samples * 10)
+
+        np_rng = np.random.default_rng(seed)
+        start = time.perf_counter()
+        batched = []
+        for _ in range(max(1, samples * 10 // batch)):
+            batched.extend(zip(*batch_playout(tracker, player, batch, np_rng)))
+        batched_time = (time.perf_counter() - start) / len(batched)
+
+        print('layers {:>2}: step-by-step {:9.1f} us   fill-and-replay {:7.1f} us ({:6.1f}x)   batched {:7.1f} us ({:6.1f}x)'.format(
+            layers, reference_time * 1e6, engine_time * 1e6, reference_time / engine_time,
+            batched_time * 1e6, reference_time / batched_time))
+        print('    step-by-step     ' + summary(reference))
+        print('    fill-and-replay  ' + summary(engine))
+        print('    batched          ' + summary(batched))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, nargs='+', default=[4, 6, 8, 10])
+    parser.add_argument('--samples', type=int, default=300)
+    parser.add_argument('--fill', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', type=int, default=10)
+    args = parser.parse_args()
+    main(args.layers, args.samples, args.fill, args.seed, args.batch)
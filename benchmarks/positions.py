@@ -0,0 +1,73 @@
+import random
+import numpy as np
+from typing import List, Tuple
+
+
+def empty_board(layers: int) -> np.array:
+    '''
+    Returns the empty hexagonal board of `layers` layers, as built by `game.get_random_board`
+    '''
+    board = np.zeros([2 * layers - 1, 2 * layers - 1]).astype(np.uint8)
+    for i in range(layers, 2 * layers - 1, 1):
+        for j in range(0, i - layers + 1, 1):
+            board[i][j] = 3
+            board[i][2 * layers - 2 - j] = 3
+    return board
+
+
+def random_board(layers: int, blocks: int, rng: random.Random) -> np.array:
+    '''
+    Seeded equivalent of `game.get_random_board`
+    '''
+    board = empty_board(layers)
+    for _ in range(blocks):
+        x = rng.randrange(0, 2 * layers - 1)
+        if x >= layers:
+            y = rng.randrange(x - layers + 1, 3 * layers - 2 - x)
+        else:
+            y = rng.randrange(0, 2 * layers - 1)
+        board[x][y] = 3
+    return board
+
+
+def random_position(layers: int, fill: float, rng: random.Random, blocks: int = 0) -> Tuple[np.array, List[Tuple[int, int]]]:
+    '''
+    Plays random alternating moves on an empty board, with `blocks` random blocked cells, until
+    a fraction `fill` of the free cells is taken
+
+    # Returns
+    Tuple[np.array, List[Tuple[int, int]]]: The board, and the moves played in order (player 1 first)
+    '''
+    board = random_board(layers, blocks, rng) if blocks else empty_board(layers)
+    empties = [(int(i), int(j)) for i, j in np.argwhere(board == 0)]
+    rng.shuffle(empties)
+    moves = empties[:int(len(empties) * fill)]
+    for turn, move in enumerate(moves):
+        board[move] = 1 + turn % 2
+    return board, moves
+
+
+def snake_board(layers: int, player_num: int = 1) -> Tuple[np.array, Tuple[int, int]]:
+    '''
+    Builds a board where `player_num` owns a single snaking chain: every other row, joined at
+    alternating ends by one cell of the row in between. The chain has no ring and its length
+    grows with the area of the board, which makes it the worst case for the path searches.
+
+    # Returns
+    Tuple[np.array, Tuple[int, int]]: The board, and the last cell of the chain
+    '''
+    board = empty_board(layers)
+    dim = board.shape[0]
+    row = lambda i: [j for j in range(dim) if board[i, j] != 3]
+    last = None
+    for i in range(0, dim, 2):
+        cells = row(i)
+        board[i, cells] = player_num
+        last = (i, cells[-1] if (i // 2) % 2 == 0 else cells[0])
+        if i + 1 < dim:
+            # The rows shrink downwards, so the end of the next row is on the board in the 3 rows
+            below = row(i + 2) if i + 2 < dim else row(i + 1)
+            j = below[-1] if (i // 2) % 2 == 0 else below[0]
+            board[i + 1, j] = player_num
+            last = (i + 1, j)
+    return board, last
@@ -0,0 +1,77 @@
+'''
+Regression check of the incremental ring detection of `ConnectivityTracker.check_win` against
+the full search of `check_ring` as first shipped (frozen in `benchmarks.baseline_ring`), on
+every position of seeded random games.
+
+Games are played to the full board, both players moving at random. A position is compared
+unless the mover already formed a ring earlier in the game: `check_ring` also reports a stone
+merely touching that older ring, which cannot happen in a real game since the ring ended it.
+Also reports how often a move is a ring candidate, that is falls back to the full ring search
+of the tracker. Exits with status 1 if the two detections disagree on any compared position.
+
+Usage: python -m benchmarks.verify_rings [--layers 3 10] [--games 1500] [--seed 0]
+'''
+import sys
+import time
+import random
+import argparse
+
+from helper import ConnectivityTracker
+from benchmarks.baseline_ring import check_ring
+from benchmarks.positions import empty_board
+
+
+def play_game(layers: int, rng: random.Random, totals: dict) -> None:
+    '''
+    Plays one random game, comparing both detections after every move and adding to `totals`
+    '''
+    board = empty_board(layers)
+    tracker = ConnectivityTracker(board)
+    moves = [(int(i), int(j)) for i, j in zip(*(board == 0).nonzero())]
+    rng.shuffle(moves)
+    ringed = {1: False, 2: False}
+    for index, move in enumerate(moves):
+        player = 1 + index % 2
+        board[move] = player
+        tracker.play(move, player)
+        if ringed[player]:
+            continue
+
+        start = time.perf_counter()
+        incremental = tracker.check_win(move, player) == (True, 'ring')
+        totals['incremental_time'] += time.perf_counter() - start
+        start = time.perf_counter()
+        reference = check_ring(board == player, move)
+        totals['reference_time'] += time.perf_counter() - start
+
+        totals['positions'] += 1
+        totals['candidates'] += tracker.ring_candidate
+        totals['rings'] += reference
+        if incremental != reference:
+            totals['mismatches'] += 1
+            if totals['mismatches'] <= 10:
+                print('mismatch: layers {}, player {}, move {}, check_ring {}, tracker {}'.format(layers, player, move, reference, incremental))
+        ringed[player] = reference
+
+
+def main(first: int, last: int, games: int, seed: int) -> int:
+    rng = random.Random(seed)
+    sizes = list(range(first, last + 1))
+    totals = {'positions': 0, 'rings': 0, 'candidates': 0, 'mismatches': 0, 'incremental_time': 0.0, 'reference_time': 0.0}
+    for game in range(games):
+        play_game(sizes[game % len(sizes)], rng, totals)
+    print('{} games on {} to {} layers: {} positions, {} rings, {} mismatches'.format(
+        games, first, last, totals['positions'], totals['rings'], totals['mismatches']))
+    print('ring candidates: {} ({:.2%} of positions)'.format(totals['candidates'], totals['candidates'] / totals['positions']))
+    print('per position: tracker check_win {:.2f} us, check_ring {:.2f} us'.format(
+        totals['incremental_time'] / totals['positions'] * 1e6, totals['reference_time'] / totals['positions'] * 1e6))
+    return 1 if totals['mismatches'] else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, nargs=2, default=[3, 10])
+    parser.add_argument('--games', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.layers[0], args.layers[1], args.games, args.seed))
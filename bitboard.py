@@ -0,0 +1,200 @@
+import numpy as np
+from typing import List, Tuple
+
+from geometry import get_geometry, Geometry, BIT_COUNT
+
+
+class BitMasks:
+    '''
+    Bitmasks of one board dimension, over the flat indices of the padded board (see `geometry`).
+
+    # Parameters
+    `geometry (Geometry)`: Geometry tables of the board
+    '''
+
+    def __init__(self, geometry: Geometry):
+        self.geometry = geometry
+        siz = geometry.dim // 2
+        self.board = 0
+        self.left = 0   # columns left of the mid-line
+        self.mid = 0    # mid-line column
+        self.right = 0  # columns right of the mid-line
+        self.edges = [0] * 6
+        self.corners = [0] * 6
+        for cell in geometry.cells:
+            bit = 1 << cell
+            self.board |= bit
+            j = geometry.coords[cell][1]
+            if j < siz:
+                self.left |= bit
+            elif j == siz:
+                self.mid |= bit
+            else:
+                self.right |= bit
+            if geometry.edge[cell] != -1:
+                self.edges[geometry.edge[cell]] |= bit
+            if geometry.corner[cell] != -1:
+                self.corners[geometry.corner[cell]] |= bit
+        self.all_edges = 0
+        for edge in self.edges:
+            self.all_edges |= edge
+        self.all_corners = 0
+        for corner in self.corners:
+            self.all_corners |= corner
+        self.up_left = self.left | self.mid      # cells having a (i - 1, j - 1) neighbour
+        self.up_right = self.mid | self.right    # cells having a (i - 1, j + 1) neighbour
+
+    def expand(self, mask: int) -> int:
+        '''
+        Returns `mask` together with all the neighbours of its cells, restricted to the board
+        '''
+        width = self.geometry.width
+        grown = (mask
+                 | (mask << width) | (mask >> width)
+                 | (mask << 1) | (mask >> 1)
+                 | ((mask & self.up_left) >> (width + 1))
+                 | ((mask & self.up_right) >> (width - 1))
+                 | ((mask & self.left) << (width + 1))
+                 | ((mask & self.right) << (width - 1)))
+        return grown & self.board
+
+    def flood_fill(self, seed: int, allowed: int) -> int:
+        '''
+        Returns the cells of `allowed` connected to the cells of `seed` (which must be in `allowed`)
+        '''
+        group = seed
+        while True:
+            grown = self.expand(group) & allowed
+            if grown == group:
+                return group
+            group = grown
+
+    def touched(self, group: int) -> Tuple[int, int]:
+        '''
+        Returns the corners and edges touched by `group`, as 6-bit masks
+        '''
+        corners = edges = 0
+        if group & self.all_corners:
+            for corner in range(6):
+                if group & self.corners[corner]:
+                    corners |= 1 << corner
+        if group & self.all_edges:
+            for edge in range(6):
+                if group & self.edges[edge]:
+                    edges |= 1 << edge
+        return corners, edges
+
+
+_MASKS = {}
+
+
+def get_masks(dim: int) -> BitMasks:
+    '''
+    Returns the bitmasks of a board of dimension `dim`, built once per process
+    '''
+    if dim not in _MASKS:
+        _MASKS[dim] = BitMasks(get_geometry(dim))
+    return _MASKS[dim]
+
+
+def to_mask(board: np.array) -> int:
+    '''
+    Returns the set of True cells of a boolean board as a bitset over the padded flat indices
+    '''
+    width = board.shape[0] + 2
+    padded = np.zeros((width, width), dtype=bool)
+    padded[1:-1, 1:-1] = board
+    return int.from_bytes(np.packbits(padded, bitorder='little').tobytes(), 'little')
+
+
+def iter_cells(mask: int):
+    '''
+    Yields the flat indices of the cells of `mask`, in increasing order
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitBoard:
+    '''
+    Board stored as one bitset per player and a bitset of blocked cells, using Python integers.
+    Bit `k` stands for the cell of flat index `k` in the padded board of `geometry`.
+
+    # Parameters
+    `dim (int)`: Dimension of the board array (`board.shape[0]`)
+    '''
+    __slots__ = ('dim', 'masks', 'stones', 'blocked')
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.masks = get_masks(dim)
+        self.stones = [0, 0, 0]
+        self.blocked = 0
+
+    @classmethod
+    def from_array(cls, board: np.array) -> 'BitBoard':
+        '''
+        Builds a bitboard from the numpy encoding (0 empty, 1/2 players, 3 blocked)
+        '''
+        bitboard = cls(board.shape[0])
+        bitboard.stones[1] = to_mask(board == 1)
+        bitboard.stones[2] = to_mask(board == 2)
+        bitboard.blocked = to_mask(board == 3)
+        return bitboard
+
+    def to_array(self, dtype=int) -> np.array:
+        '''
+        Returns the board in the numpy encoding (0 empty, 1/2 players, 3 blocked)
+        '''
+        geometry = self.masks.geometry
+        board = np.zeros(geometry.area, dtype=dtype)
+        for value, mask in ((1, self.stones[1]), (2, self.stones[2]), (3, self.blocked)):
+            board[list(iter_cells(mask))] = value
+        dim = self.dim
+        return board.reshape(geometry.width, geometry.width)[1:dim + 1, 1:dim + 1].copy()
+
+    def copy(self) -> 'BitBoard':
+        clone = BitBoard.__new__(BitBoard)
+        clone.dim = self.dim
+        clone.masks = self.masks
+        clone.stones = self.stones[:]
+        clone.blocked = self.blocked
+        return clone
+
+    def bit(self, move: Tuple[int, int]) -> int:
+        return 1 << int(self.masks.geometry.index(*move))
+
+    def play(self, move: Tuple[int, int], player_num: int) -> None:
+        self.stones[player_num] |= self.bit(move)
+
+    def empty(self) -> int:
+        '''
+        Returns the bitset of the empty cells
+        '''
+        return self.masks.board & ~(self.stones[1] | self.stones[2] | self.blocked)
+
+    def empty_cells(self) -> List[Tuple[int, int]]:
+        '''
+        Returns the empty cells in row-major order, like `helper.get_valid_actions`
+        '''
+        coords = self.masks.geometry.coords
+        return [coords[cell] for cell in iter_cells(self.empty())]
+
+    def group(self, move: Tuple[int, int], player_num: int) -> int:
+        '''
+        Returns the bitset of the group of `player_num` containing the stone at `move`
+        '''
+        return self.masks.flood_fill(self.bit(move), self.stones[player_num])
+
+    def check_fork_and_bridge(self, move: Tuple[int, int], player_num: int) -> Tuple[bool, str]:
+        '''
+        Same contract as `helper.check_fork_and_bridge`, for the stone of `player_num` at `move`
+        '''
+        corners, edges = self.masks.touched(self.group(move, player_num))
+        if BIT_COUNT[edges] >= 3:
+            return True, "fork"
+        if BIT_COUNT[corners] >= 2:
+            return True, "bridge"
+        return False, None
@@ -0,0 +1,211 @@
+'''
+Opening book: the move to play in early positions, searched offline once per board size.
+
+A book is a binary file holding a small header followed by fixed-size records sorted by the
+canonical key of their position. It is memory-mapped and searched by bisection, so that it
+costs nothing to load and a lookup only touches a few pages. Positions are keyed up to the
+12 symmetries of the hexagon, and the moves are stored for the canonical orientation.
+
+Usage: python book.py --layers 4 [--start_file initial_states/size4.txt] [--seconds 20] [--depth 3] [--width 3]
+'''
+import os
+import mmap
+import struct
+import argparse
+import numpy as np
+from typing import Dict, List, Tuple, Union
+
+from geometry import get_geometry
+
+HEADER = struct.Struct('<4sII')  # Magic, version, board dimension
+MAGIC = b'HVBK'
+VERSION = 1
+RECORD = np.dtype([('key', '<u8'), ('move', '<u2'), ('visits', '<u4'), ('value', '<f4')])
+
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books')
+
+
+def book_path(dim: int) -> str:
+    '''
+    Returns the path of the book of the boards of dimension `dim`
+    '''
+    return os.path.join(BOOK_DIR, 'size{}.book'.format((dim + 1) // 2))
+
+
+def canonical_key(board: np.array) -> Tuple[int, int]:
+    '''
+    Computes the key of a position that is the same for all its symmetric positions
+
+    # Parameters
+    `board (numpy array)`: Game board
+
+    # Returns
+    Tuple[int, int]: Smallest Zobrist key of the stones and blocked cells over the 12 symmetries of
+        the hexagon, and the symmetry giving it
+    '''
+    geometry = get_geometry(board.shape[0])
+    padded = geometry.pad(board)
+    taken = np.flatnonzero(geometry.on_board & (padded != 0))
+    keys = np.bitwise_xor.reduce(geometry.zobrist_keys[padded[taken], geometry.symmetries[:, taken]], axis=1)
+    symmetry = int(np.argmin(keys))
+    return int(keys[symmetry]), symmetry
+
+
+def canonical_move(dim: int, move: Tuple[int, int], symmetry: int) -> int:
+    '''
+    Returns the cell id (i * dim + j) of `move` in the canonical orientation given by `symmetry`
+    '''
+    geometry = get_geometry(dim)
+    i, j = geometry.coords[geometry.symmetries[symmetry, geometry.index(*move)]]
+    return i * dim + j
+
+
+def actual_move(dim: int, cell: int, symmetry: int) -> Tuple[int, int]:
+    '''
+    Returns the move whose canonical cell id for `symmetry` is `cell`, inverse of `canonical_move`
+    '''
+    geometry = get_geometry(dim)
+    image = geometry.index(*divmod(cell, dim))
+    return geometry.coords[int(np.flatnonzero(geometry.symmetries[symmetry] == image)[0])]
+
+
+class OpeningBook:
+    '''
+    Read-only opening book, memory-mapped from its file
+
+    # Parameters
+    `path (str)`: Path of the book file
+    '''
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.dim = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError('{} is not an opening book of version {}'.format(path, VERSION))
+        self.records = np.frombuffer(self.map, dtype=RECORD, offset=HEADER.size)
+        self.keys = self.records['key']
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def lookup(self, board: np.array) -> Union[Tuple[int, int], None]:
+        '''
+        Looks up the move of a position
+
+        # Parameters
+        `board (numpy array)`: Game board
+
+        # Returns
+        Tuple[int, int]: Move stored for the position, None if it is not in the book
+        '''
+        if board.shape[0] != self.dim:
+            return None
+        key, symmetry = canonical_key(board)
+        index = int(np.searchsorted(self.keys, np.uint64(key)))
+        if index == len(self.keys) or int(self.keys[index]) != key:
+            return None
+        move = actual_move(self.dim, int(self.records['move'][index]), symmetry)
+        # A different position with the same key would be a collision
+        return move if board[move] == 0 else None
+
+    def close(self) -> None:
+        self.records = self.keys = None
+        self.map.close()
+
+
+def load_book(dim: int) -> Union[OpeningBook, None]:
+    '''
+    Opens the book of the boards of dimension `dim`, None if there is none
+    '''
+    path = book_path(dim)
+    return OpeningBook(path) if os.path.exists(path) else None
+
+
+def write_book(path: str, dim: int, entries: Dict[int, Tuple[int, int, float]]) -> None:
+    '''
+    Writes a book file
+
+    # Parameters
+    `path (str)`: Path of the book file
+    `dim (int)`: Dimension of the board array
+    `entries (Dict[int, Tuple[int, int, float]])`: Canonical key of every position, mapped to its
+        canonical move cell id, visits of the move and mean value of the move
+    '''
+    records = np.zeros(len(entries), dtype=RECORD)
+    for index, key in enumerate(sorted(entries)):
+        records[index] = (key,) + tuple(entries[key])
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, dim))
+        file.write(records.tobytes())
+
+
+def build_book(boards: List[np.array], seconds: float, depth: int, width: int) -> Dict[int, Tuple[int, int, float]]:
+    '''
+    Searches the start positions and the early positions following them
+
+    Every position gets a search of `seconds` seconds and its most visited move is recorded. The
+    positions after its `width` most visited moves are searched next, up to `depth` moves deep, so
+    that the book also covers the replies that the opponent is most likely to play.
+
+    # Parameters
+    `boards (List[numpy array])`: Start positions
+    `seconds (float)`: Search time of every position
+    `depth (int)`: Number of moves from the start positions covered by the book
+    `width (int)`: Number of moves followed from every position
+
+    # Returns
+    Dict[int, Tuple[int, int, float]]: Entries of the book, as taken by `write_book`
+    '''
+    from players.ai import Tree, search
+
+    entries = {}
+    frontier = list(boards)
+    for ply in range(depth):
+        following = []
+        for board in frontier:
+            key, symmetry = canonical_key(board)
+            if key in entries:
+                continue
+            player = 1 if (board == 1).sum() == (board == 2).sum() else 2
+            tree = Tree(board, player)
+            search(tree, seconds, target_depth=2**32-1, num_rollouts=10)
+            children = tree.get_children(0)
+            children = children[np.argsort(-tree.visits[children], kind='stable')]
+            best = children[0]
+            move = tree.coords(tree.move[best])
+            entries[key] = (canonical_move(board.shape[0], move, symmetry), int(tree.visits[best]),
+                            float(tree.value[best] / max(tree.visits[best], 1)))
+            print('ply {} move {} visits {} value {:.3f}'.format(ply, move, *entries[key][1:]), flush=True)
+            for child in children[:width]:
+                if not tree.terminal[child]:
+                    position = board.copy()
+                    position[tree.coords(tree.move[child])] = player
+                    following.append(position)
+        frontier = following
+    return entries
+
+
+def main(layers: int, start_files: List[str], seconds: float, depth: int, width: int):
+    if not start_files:
+        start_files = [os.path.join('initial_states', 'size{}.txt'.format(layers))]
+    boards = [np.loadtxt(start_file, dtype=int, ndmin=2) for start_file in start_files]
+    dim = 2 * layers - 1
+    if any(board.shape != (dim, dim) for board in boards):
+        raise ValueError('The start positions must have {} layers'.format(layers))
+    entries = build_book(boards, seconds, depth, width)
+    os.makedirs(BOOK_DIR, exist_ok=True)
+    write_book(book_path(dim), dim, entries)
+    print('{} positions written to {}'.format(len(entries), book_path(dim)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--layers', type=int, default=4)
+    parser.add_argument('--start_file', type=str, nargs='*', default=[], help='Start positions, initial_states/size<layers>.txt by default')
+    parser.add_argument('--seconds', type=float, default=20, help='Search time of every position')
+    parser.add_argument('--depth', type=int, default=3, help='Number of moves covered by the book')
+    parser.add_argument('--width', type=int, default=3, help='Number of moves followed from every position')
+    args = parser.parse_args()
+    main(args.layers, args.start_file, args.seconds, args.depth, args.width)
@@ -18,13 +18,14 @@ import tkinter as tk
 
 
 # Local imports
-from helper import get_valid_actions, check_win, HEXAGON_COORDS, CLICK_EVENT, PLAYER_TIME
+from helper import MoveSet, ConnectivityTracker, HEXAGON_COORDS, CLICK_EVENT, PLAYER_TIME
 
 # Import Players
 from players.ai import AIPlayer
 from players.ai2 import AIPlayer as AIPlayer2
 from players.random import RandomPlayer
 from players.human import HumanPlayer
+from instrumentation import StatsWriter
 
 
 TimeLimitExceedAction = (1000, True)
@@ -33,9 +34,9 @@ TimeLimitExceedAction = (1000, True)
 def turn_worker(state: np.array, send_end, p_func: Callable[[np.array], Tuple[int, bool]], PLAYER_TIME):
     send_end.send(p_func(state, PLAYER_TIME))
 
-def make_player(name, num, timer=PLAYER_TIME):
+def make_player(name, num, timer=PLAYER_TIME, workers=1, parallel='root'):
     if name == 'ai':
-        return AIPlayer(num, timer)
+        return AIPlayer(num, timer, workers, parallel)
     elif name == 'ai2':
         return AIPlayer2(num, timer)
     elif name == 'random':
@@ -45,7 +46,7 @@ def make_player(name, num, timer=PLAYER_TIME):
 
 
 class Game:
-    def __init__(self, player1_name, player2_name, player1, player2, time: int, board_init: np.array, layers: int, mode: str):
+    def __init__(self, player1_name, player2_name, player1, player2, time: int, board_init: np.array, layers: int, mode: str, workers: int = 1, parallel: str = 'root', ponder: bool = False, stats: bool = False, policy: bool = False, batched: bool = False):
         """
         :param player1:
         :param player2:
@@ -60,6 +61,8 @@ class Game:
         self.faded_colors = ['', 'light yellow', 'orange', 'gray']  # Extra white color added
         self.layers = layers
         self.state = board_init
+        self.tracker = ConnectivityTracker(board_init)
+        self.valid_actions = MoveSet.from_board(board_init)
         self.gui_board = []
         PLAYER_TIME[0] = time
         PLAYER_TIME[1] = time
@@ -74,7 +77,7 @@ class Game:
         self.pause_timer = Value('b', True)
 
         self.parent_conn, self.child_conn = mp.Pipe()
-        self.proc = mp.Process(target=self.player_workers, args=(make_player, self.game_over, self.child_conn, player1_name, player2_name, PLAYER_TIME))
+        self.proc = mp.Process(target=self.player_workers, args=(make_player, self.game_over, self.child_conn, player1_name, player2_name, PLAYER_TIME, workers, parallel, ponder, stats, policy, batched))
         self.proc.start()
 
         # Log: Writing initial state of the board to log file
@@ -214,6 +217,9 @@ class Game:
             sleep(0.01)
 
             if game_over.value:
+                # Let the players finish (e.g. save what they learned), then stop one still searching
+                self.parent_conn.send(None)
+                self.proc.join(timeout=5)
                 if self.proc.is_alive():
                     self.proc.terminate()
 
@@ -237,17 +243,40 @@ class Game:
                 break
 
     @staticmethod
-    def player_workers(make_player, game_over, pipe_conn, player1, player2, timer):
-        players = [make_player(player1, 1, timer), make_player(player2, 2, timer)]
+    def player_workers(make_player, game_over, pipe_conn, player1, player2, timer, workers=1, parallel='root', ponder=False, stats=False, policy=False, batched=False):
+        players = [make_player(player1, 1, timer, workers, parallel), make_player(player2, 2, timer, workers, parallel)]
+        if stats:
+            writer = StatsWriter()
+            for player in players:
+                if hasattr(player, 'stats_writer'):
+                    player.stats_writer = writer
+        if policy:
+            for player in players:
+                if hasattr(player, 'persist_policy'):
+                    player.persist_policy = True
+        if batched:
+            for player in players:
+                if hasattr(player, 'batched'):
+                    player.batched = True
 
         while not game_over.value:
-            current_turn, state = pipe_conn.recv()
+            message = pipe_conn.recv()
+            if message is None:
+                break
+            current_turn, state = message
             move = players[current_turn].get_move(state)
             pipe_conn.send(move)
+            # Search on the opponent's time until the next state arrives. Only when the opponent does not
+            # search in this process too, so that pondering never delays it beyond one iteration.
+            if ponder and hasattr(players[current_turn], 'ponder') and players[1 - current_turn].type != 'ai':
+                players[current_turn].ponder(lambda: pipe_conn.poll() or game_over.value)
+        for player in players:
+            if hasattr(player, 'end_game'):
+                player.end_game()
 
     def make_move(self, game_over, pause_timer, current_turn):
         current_player = self.players[current_turn.value]
-        valid_actions = get_valid_actions(self.state, current_player.player_number)
+        valid_actions = self.valid_actions
 
         if len(valid_actions) == 0:
             game_over.value = True
@@ -291,10 +320,12 @@ class Game:
                 move = action
                 # move is a tuple
                 self.update_board(move, current_player.player_number, current_turn)
+                self.valid_actions.remove(move)
+                self.tracker.play(move, current_player.player_number)
                 log_action = {'player': current_player.player_number, 'move': move}
 
                 self.winning_path = []
-                win, way = check_win(self.state, move, current_player.player_number, self.winning_path)
+                win, way = self.tracker.check_win(move, current_player.player_number, self.winning_path)
                 if win:
                     game_over.value = True
                     self.structure_formed = way
@@ -354,14 +385,14 @@ def get_start_board(file_pth: str) -> Tuple[int, np.array]:
     board = np.array(b, dtype=int)
     return board
 
-def main(player1: str, player2: str, time: int, dim: int, mode: str, init_file_name: str = None, blocks: int = 0):
+def main(player1: str, player2: str, time: int, dim: int, mode: str, init_file_name: str = None, blocks: int = 0, workers: int = 1, parallel: str = 'root', ponder: bool = False, stats: bool = False, policy: bool = False, batched: bool = False):
     random.seed(datetime.timestamp(datetime.now()))
     if init_file_name is not None:
         board = get_start_board(init_file_name)
     else:
         board = get_random_board(dim, blocks)
     dim = (board.shape[0] + 1) // 2
-    Game(player1, player2, make_player(player1, 1), make_player(player2, 2), time, board, dim, mode)
+    Game(player1, player2, make_player(player1, 1), make_player(player2, 2), time, board, dim, mode, workers, parallel, ponder, stats, policy, batched)
 
 
 if __name__ == '__main__':
@@ -374,5 +405,11 @@ if __name__ == '__main__':
     parser.add_argument('--dim' ,   type=int, default=4,   help='Dimension of the side of the (hexagonal) board (int)')
     parser.add_argument('--blocks', type=int, default=0,   help='Number of blocked cells in the board (int)')
     parser.add_argument("--start_file", type=str, default=None, help="Custom initial state of the game specified in havannah/initial_states/<filename>")
+    parser.add_argument('--workers', type=int, default=1,   help='Number of search processes of the ai agent (int)')
+    parser.add_argument('--parallel', type=str, default='root', choices=['root', 'tree'], help='Independent trees per worker, or one shared tree')
+    parser.add_argument('--ponder', action='store_true', help='Let the ai agent search while its opponent thinks')
+    parser.add_argument('--stats', action='store_true', help='Record the search of every ai move in stats.jsonl, next to logs.txt')
+    parser.add_argument('--policy', action='store_true', help='Start the playout policy of the ai2 agent from policies/ and save it back during the game')
+    parser.add_argument('--batched', action='store_true', help='Let the ai agent simulate the rollouts of every leaf together, as one NumPy call')
     args = parser.parse_args()
-    main(args.player1, args.player2, args.time, args.dim, args.mode, args.start_file, args.blocks)
+    main(args.player1, args.player2, args.time, args.dim, args.mode, args.start_file, args.blocks, args.workers, args.parallel, args.ponder, args.stats, args.policy, args.batched)
@@ -0,0 +1,219 @@
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+
+
+# Directions of the hexagonal grid, referred to by their index in hot loops
+DIRECTIONS = ("up", "down", "top-left", "top-right", "bottom-left", "bottom-right")
+UP, DOWN, TOP_LEFT, TOP_RIGHT, BOTTOM_LEFT, BOTTOM_RIGHT = range(6)
+DIRECTION_INDEX = {name: index for index, name in enumerate(DIRECTIONS)}
+# The directions in clockwise order, so that consecutive ones (and the last and first) point to adjacent cells
+CLOCKWISE = (UP, TOP_RIGHT, BOTTOM_RIGHT, DOWN, BOTTOM_LEFT, TOP_LEFT)
+
+# The 3 "forward" directions from a direction (no sharp turns), in search order
+FORWARD = (
+    (TOP_LEFT, UP, TOP_RIGHT),
+    (DOWN, BOTTOM_LEFT, BOTTOM_RIGHT),
+    (BOTTOM_LEFT, TOP_LEFT, UP),
+    (TOP_RIGHT, UP, BOTTOM_RIGHT),
+    (BOTTOM_LEFT, DOWN, TOP_LEFT),
+    (BOTTOM_RIGHT, DOWN, TOP_RIGHT),
+)
+
+# (row, column) step of every direction, for the left half, the mid-line and the right half of the board
+HALF_STEPS = (
+    ((-1, 0), (1, 0), (-1, -1), (0, 1), (0, -1), (1, 1)),    # half < 0
+    ((-1, 0), (1, 0), (-1, -1), (-1, 1), (0, -1), (0, 1)),   # half = 0
+    ((-1, 0), (1, 0), (0, -1), (-1, 1), (1, -1), (0, 1)),    # half > 0
+)
+
+# Value of the padding cells around the board, behaves like a blocked cell
+SENTINEL = 3
+
+# Number of set bits of every corner or edge mask (6 bits)
+BIT_COUNT = [bin(mask).count('1') for mask in range(64)]
+
+
+def hex_neighbours(dim: int, i: int, j: int) -> List[Tuple[int, int]]:
+    '''
+    Computes the neighbours of the cell (i, j) that lie inside the `dim` x `dim` array
+
+    # Parameters
+    `dim (int)`: Dimension of the board array
+    `i (int)`, `j (int)`: Coordinates of the cell
+
+    # Returns
+    List[Tuple[int, int]]: Neighbours of the cell, in the order used by `helper.get_neighbours`
+    '''
+    siz = dim // 2
+    neighbours = []
+    if i > 0:
+        neighbours.append((i - 1, j))
+    if i < dim - 1:
+        neighbours.append((i + 1, j))
+    if j > 0:
+        neighbours.append((i, j - 1))
+    if j < dim - 1:
+        neighbours.append((i, j + 1))
+    if i > 0 and j <= siz and j > 0:
+        neighbours.append((i - 1, j - 1))
+    if i > 0 and j >= siz and j < dim - 1:
+        neighbours.append((i - 1, j + 1))
+    if j < siz and i < dim - 1:
+        neighbours.append((i + 1, j + 1))
+    if j > siz and i < dim - 1:
+        neighbours.append((i + 1, j - 1))
+    return neighbours
+
+
+def hex_edge(dim: int, i: int, j: int) -> int:
+    '''
+    Computes the edge (0 to 5) on which the cell (i, j) lies, -1 if none
+    '''
+    if j == 0 and i > 0 and i < dim // 2:
+        return 0
+    if i == 0 and j > 0 and j < dim // 2:
+        return 1
+    if i == 0 and j > dim // 2 and j < dim - 1:
+        return 2
+    if j == dim - 1 and i > 0 and i < dim // 2:
+        return 3
+    if i > dim // 2 and i < dim - 1 and i + j == 3 * (dim // 2):
+        return 4
+    if i > dim // 2 and i < dim - 1 and i - j == dim // 2:
+        return 5
+    return -1
+
+
+def hex_corner(dim: int, i: int, j: int) -> int:
+    '''
+    Computes the corner (0 to 5) at which the cell (i, j) lies, -1 if none
+    '''
+    corners = ((0, 0), (0, dim // 2), (0, dim - 1), (dim // 2, dim - 1), (dim - 1, dim // 2), (dim // 2, 0))
+    if (i, j) in corners:
+        return corners.index((i, j))
+    return -1
+
+
+class Geometry:
+    '''
+    Lookup tables of the hexagonal geometry for one board dimension.
+
+    Cells are addressed by a flat index into the board padded with one ring of
+    `SENTINEL` cells, so that stepping from any cell of the board in any direction
+    stays inside the padded array and needs no bounds check.
+
+    # Parameters
+    `dim (int)`: Dimension of the board array (`board.shape[0]`)
+    '''
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.width = dim + 2
+        self.area = self.width * self.width
+        siz = dim // 2
+        width = self.width
+
+        # Flat index of every cell of the board, in row-major order
+        self.cells = tuple(self.index(i, j) for i in range(dim) for j in range(dim))
+        self.coords = [None] * self.area
+        for i in range(dim):
+            for j in range(dim):
+                self.coords[self.index(i, j)] = (i, j)
+
+        # Per cell: half of the board (-1, 0, 1), flat offset of each direction, neighbours, edge and corner
+        self.half = [0] * self.area
+        self.steps = [()] * self.area
+        self.neighbours = [()] * self.area
+        self.edge = [-1] * self.area
+        self.corner = [-1] * self.area
+        self.edge_bit = [0] * self.area
+        self.corner_bit = [0] * self.area
+        self.half_offsets = tuple(tuple(di * width + dj for di, dj in steps) for steps in HALF_STEPS)
+        for cell in self.cells:
+            i, j = self.coords[cell]
+            self.half[cell] = (j > siz) - (j < siz)
+            self.steps[cell] = self.half_offsets[self.half[cell] + 1]
+            self.neighbours[cell] = tuple(self.index(ni, nj) for ni, nj in hex_neighbours(dim, i, j))
+            self.edge[cell] = hex_edge(dim, i, j)
+            self.corner[cell] = hex_corner(dim, i, j)
+            if self.edge[cell] != -1:
+                self.edge_bit[cell] = 1 << self.edge[cell]
+            if self.corner[cell] != -1:
+                self.corner_bit[cell] = 1 << self.corner[cell]
+
+        # Whether every flat index is a cell of the hexagon (not the padding or the cut-off corners of the array)
+        self.on_board = np.zeros(self.area, dtype=bool)
+        for cell in self.cells:
+            i, j = self.coords[cell]
+            self.on_board[cell] = i - j <= siz and i + j <= 3 * siz
+
+        # Zobrist keys of a stone of each player (rows 1 and 2) on every flat index, seeded by the dimension
+        # so that every process hashes the same position to the same key
+        rng = np.random.default_rng(dim)
+        keys = rng.integers(0, 2**64 - 1, size=(4, self.area), dtype=np.uint64, endpoint=True)
+        keys[0] = 0
+        self.zobrist_keys = keys  # Row 3 for the blocked cells, which only matter when comparing boards
+        self.zobrist = keys.tolist()
+
+        # The 12 symmetries of the hexagon (6 rotations, with and without a reflection), as the flat index of the
+        # image of every flat index; the cells off the hexagon stay in place. The cells are mapped through cube
+        # coordinates centred on the middle cell: x = j - siz, z = i - min(j, siz), y = -x - z.
+        self.symmetries = np.tile(np.arange(self.area, dtype=np.int32), (12, 1))
+        for cell in np.flatnonzero(self.on_board).tolist():
+            i, j = self.coords[cell]
+            x, z = j - siz, i - min(j, siz)
+            for symmetry in range(12):
+                a, b, c = (x, -x - z, z) if symmetry < 6 else (x, z, -x - z)
+                for _ in range(symmetry % 6):
+                    a, b, c = -c, -a, -b
+                self.symmetries[symmetry, cell] = self.index(c + min(a + siz, siz), a + siz)
+
+        # Same tables keyed by coordinates, for the tuple based API of `helper`
+        self.neighbour_coords = {self.coords[cell]: [self.coords[n] for n in self.neighbours[cell]] for cell in self.cells}
+        self.edge_of = {self.coords[cell]: self.edge[cell] for cell in self.cells}
+        self.corner_of = {self.coords[cell]: self.corner[cell] for cell in self.cells}
+
+        # The 6 neighbours of every cell in clockwise order, padding or off-hexagon cells included
+        self.around = [()] * self.area
+        for cell in self.cells:
+            self.around[cell] = tuple(cell + self.steps[cell][direction] for direction in CLOCKWISE)
+
+        # Neighbour in every direction as an array, pointing into the padding where the board ends
+        self.neighbour_table = np.zeros((self.area, 6), dtype=np.int32)
+        for cell in self.cells:
+            self.neighbour_table[cell] = [cell + offset for offset in self.steps[cell]]
+
+    def index(self, i: int, j: int) -> int:
+        '''
+        Returns the flat index of the cell (i, j) in the padded board
+        '''
+        return (i + 1) * self.width + j + 1
+
+    def pad(self, board: np.array) -> np.array:
+        '''
+        Returns the board as a flat array padded with `SENTINEL` cells
+
+        # Parameters
+        `board (numpy array)`: Game board, or a boolean board
+
+        # Returns
+        numpy array: Flat padded board, with the same dtype as `board`
+        '''
+        padded = np.full((self.width, self.width), SENTINEL if board.dtype != bool else False, dtype=board.dtype)
+        padded[1:-1, 1:-1] = board
+        return padded.ravel()
+
+
+@lru_cache(maxsize=None)
+def get_geometry(dim: int) -> Geometry:
+    '''
+    Returns the geometry tables of a board of dimension `dim`, built once per process
+
+    # Parameters
+    `dim (int)`: Dimension of the board array (`board.shape[0]`)
+
+    # Returns
+    Geometry: Shared, read-only lookup tables
+    '''
+    return Geometry(dim)
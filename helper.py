@@ -1,8 +1,9 @@
-import heapq
+import random
 import numpy as np
-from collections import deque
-from typing import List, Tuple, Dict, Union
+from typing import List, Tuple, Dict, Union, Iterable
 from multiprocessing import Array
+from bitboard import get_masks, to_mask, iter_cells
+from geometry import get_geometry, hex_neighbours, DIRECTIONS, DIRECTION_INDEX, FORWARD, HALF_STEPS, UP, DOWN, TOP_LEFT, BOTTOM_LEFT, BIT_COUNT
 
 
 PLAYER_TIME = Array('f', [0, 0])
@@ -51,6 +52,71 @@ def get_valid_actions(board: np.array, player: int = None) -> List[Tuple[int, in
     valid_moves = [tuple(move) for move in valid_moves]
     return valid_moves
 
+class MoveSet:
+    '''
+    Set of moves with O(1) insertion, removal, membership test and random pick.
+    Moves are stored in a list, with a map from move to position; removing a move
+    swaps the last move of the list into its slot.
+
+    # Parameters
+    `moves (Iterable[Tuple[int, int]])`: Initial moves
+    '''
+    __slots__ = ('moves', 'index')
+
+    def __init__(self, moves: Iterable[Tuple[int, int]] = ()):
+        self.moves = list(moves)
+        self.index = {move: position for position, move in enumerate(self.moves)}
+
+    @classmethod
+    def from_board(cls, board: np.array) -> 'MoveSet':
+        '''
+        Returns the valid actions of `board` (see `get_valid_actions`) as a move set
+        '''
+        return cls(map(tuple, np.argwhere(board == 0).tolist()))
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def __contains__(self, move: Tuple[int, int]) -> bool:
+        return move in self.index
+
+    def __iter__(self):
+        return iter(self.moves)
+
+    def __getitem__(self, position: int) -> Tuple[int, int]:
+        return self.moves[position]
+
+    def add(self, move: Tuple[int, int]) -> None:
+        if move not in self.index:
+            self.index[move] = len(self.moves)
+            self.moves.append(move)
+
+    def remove(self, move: Tuple[int, int]) -> None:
+        position = self.index.pop(move)
+        last = self.moves.pop()
+        if position < len(self.moves):
+            self.moves[position] = last
+            self.index[last] = position
+
+    def discard(self, move: Tuple[int, int]) -> None:
+        if move in self.index:
+            self.remove(move)
+
+    def pop_random(self, rng=random) -> Tuple[int, int]:
+        '''
+        Removes and returns a move chosen uniformly at random
+        '''
+        move = self.moves[rng.randrange(len(self.moves))]
+        self.remove(move)
+        return move
+
+    def copy(self) -> 'MoveSet':
+        clone = MoveSet.__new__(MoveSet)
+        clone.moves = self.moves[:]
+        clone.index = self.index.copy()
+        return clone
+
+
 def get_vertices_on_edge(edge: int, dim: int) -> List[Tuple[int, int]]:
     '''
     Returns the vertices on an edge of the board
@@ -114,20 +180,7 @@ def get_edge(vertex: Tuple[int, int], dim: int) -> int:
     # Returns
     int: Number of the edge on which the vertex lies, if it does else returns -1. Edges are numbered from 0 to 5
     '''
-    i, j = vertex
-    if j == 0 and i > 0 and i < dim // 2:
-        return 0
-    if i == 0 and j > 0 and j < dim // 2:
-        return 1
-    if i == 0 and j > dim // 2 and j < dim - 1:
-        return 2
-    if j == dim - 1 and i > 0 and i < dim // 2:
-        return 3
-    if i > dim // 2 and i < dim - 1 and i + j == 3 * (dim // 2):
-        return 4
-    if i > dim // 2 and i < dim - 1 and i - j == dim // 2:
-        return 5
-    return -1
+    return get_geometry(dim).edge_of.get(vertex, -1)
 
 
 def get_corner(vertex: Tuple[int, int], dim: int) -> int:
@@ -141,20 +194,7 @@ def get_corner(vertex: Tuple[int, int], dim: int) -> int:
     # Returns
     int: Number of the corner at which the vertex lies, if it does else returns -1. Corners are numbered from 0 to 5
     '''
-    i, j = vertex
-    if i == 0 and j == 0:
-        return 0
-    if i == 0 and j == dim // 2:
-        return 1
-    if i == 0 and j == dim - 1:
-        return 2
-    if i == dim // 2 and j == dim - 1:
-        return 3
-    if i == dim - 1 and j == dim // 2:
-        return 4
-    if i == dim // 2 and j == 0:
-        return 5
-    return -1
+    return get_geometry(dim).corner_of.get(vertex, -1)
 
 
 def get_neighbours(dim: int, vertex: Tuple[int, int]) -> List[Tuple[int, int]]:
@@ -170,26 +210,10 @@ def get_neighbours(dim: int, vertex: Tuple[int, int]) -> List[Tuple[int, int]]:
         - First tuple in each list is a virtual neighbour of the "vertex"
         - Second and Third tuples in each list are common neighbours of the "vertex" and the virtual neighbour
     '''
-    i, j = vertex
-    siz = dim//2
-    neighbours = []
-    if i > 0:
-        neighbours.append((i - 1, j))
-    if i < dim - 1:
-        neighbours.append((i + 1, j))
-    if j > 0:
-        neighbours.append((i, j - 1))
-    if j < dim - 1:
-        neighbours.append((i, j + 1))
-    if i > 0 and j <= siz and j > 0:
-        neighbours.append((i - 1, j - 1))
-    if i > 0 and j >= siz and j < dim - 1:
-        neighbours.append((i - 1, j + 1))
-    if j < siz and i < dim - 1:
-        neighbours.append((i + 1, j + 1))
-    if j > siz and i < dim - 1:
-        neighbours.append((i + 1, j - 1))
-    return neighbours
+    neighbours = get_geometry(dim).neighbour_coords.get(vertex)
+    if neighbours is None:
+        return hex_neighbours(dim, *vertex)
+    return list(neighbours)
 
 def get_all_corners(dim: int) -> List[Tuple[int, int]]:
     '''
@@ -244,40 +268,9 @@ def move_coordinates(direction: str, half: int) -> Tuple[int, int]:
     # Returns
     Tuple[int, int]: Coordinates of the move in the given direction
     '''
-    if direction == "up":
-        return (-1, 0)
-    elif direction == "down":
-        return (1, 0)
-    elif direction == "top-left":
-        if half == 0:
-            return (-1, -1)
-        elif half < 0:
-            return (-1, -1)
-        elif half > 0:
-            return (0, -1)
-    elif direction == "top-right":
-        if half == 0:
-            return (-1, 1)
-        elif half < 0:
-            return (0, 1)
-        elif half > 0:
-            return (-1, 1)
-    elif direction == "bottom-left":
-        if half == 0:
-            return (0, -1)
-        elif half < 0:
-            return (0, -1)
-        elif half > 0:
-            return (1, -1)
-    elif direction == "bottom-right":
-        if half == 0:
-            return (0, 1)
-        elif half < 0:
-            return (1, 1)
-        elif half > 0:
-            return (0, 1)
-
-    return None
+    if direction not in DIRECTION_INDEX:
+        return None
+    return HALF_STEPS[int(half > 0) - int(half < 0) + 1][DIRECTION_INDEX[direction]]
 
 
 def three_forward_moves(direction: str) -> List[str]:
@@ -290,19 +283,9 @@ def three_forward_moves(direction: str) -> List[str]:
     # Returns
     List[str]: List of 3 forward moves from the current direction
     '''
-    if direction == "up":
-        return ["top-left", "up", "top-right"]
-    if direction == "down":
-        return ["down", "bottom-left", "bottom-right"]
-    if direction == "top-left":
-        return ["bottom-left", "top-left", "up"]
-    if direction == "top-right":
-        return ["top-right", "up", "bottom-right"]
-    if direction == "bottom-left":
-        return ["bottom-left", "down", "top-left"]
-    if direction == "bottom-right":
-        return ["bottom-right", "down", "top-right"]
-    return None
+    if direction not in DIRECTION_INDEX:
+        return None
+    return [DIRECTIONS[forward] for forward in FORWARD[DIRECTION_INDEX[direction]]]
 
 
 def bfs_reachable(board: np.array, start: Tuple[int, int]):
@@ -316,20 +299,80 @@ def bfs_reachable(board: np.array, start: Tuple[int, int]):
     # Returns
     Set[Tuple[int, int]]: Set of reachable points accessible from start, via direct neighbours
     '''
-    dim = board.shape[0]
+    masks = get_masks(board.shape[0])
+    seed = 1 << int(masks.geometry.index(*start))
+    coords = masks.geometry.coords
+    return {coords[cell] for cell in iter_cells(masks.flood_fill(seed, to_mask(board) | seed))}
+
+
+def group_tree(cells: List[int], player_num: int, geometry, start: int) -> Dict[int, int]:
+    '''
+    Breadth-first search over the group containing `start` on a flat padded board (see `geometry`)
+
+    # Parameters
+    cells (List[int]): padded board, cells equal to `player_num` belong to the player
+    player_num (int): value of the player's cells
+    geometry (Geometry): geometry tables of the board
+    start (int): flat index of the starting point
+
+    # Returns
+    Dict[int, int]: parent of every cell of the group in the search tree (None for `start`), in BFS order
+    '''
+    neighbours = geometry.neighbours
+    parents = {start: None}
+    order = [start]
+    for current in order:
+        for neighbour in neighbours[current]:
+            if cells[neighbour] == player_num and neighbour not in parents:
+                parents[neighbour] = current
+                order.append(neighbour)
+    return parents
+
+
+def trace_back(parents: Dict[int, int], node: int) -> List[int]:
+    '''
+    Returns the nodes on the way from `node` back to the root of the search tree `parents`
+    '''
+    chain = []
+    while node is not None:
+        chain.append(node)
+        node = parents[node]
+    return chain
 
-    queue = deque([start])
-    visited = set()
-    visited.add(start)
 
-    while queue:
-        current = queue.popleft()
-        for nx, ny in get_neighbours(dim, current):
-            if is_valid(nx, ny, dim) and (nx, ny) not in visited and board[nx, ny]:
-                queue.append((nx, ny))
-                visited.add((nx, ny))
+def structure_path(parents: Dict[int, int], geometry, way: str) -> List[Tuple[int, int]]:
+    '''
+    Extracts the points forming a fork or a bridge from the search tree of a group
 
-    return visited
+    # Parameters
+    parents (Dict[int, int]): search tree of the group, as returned by `group_tree`
+    geometry (Geometry): geometry tables of the board
+    way (str): "fork" or "bridge"
+
+    # Returns
+    List[Tuple[int, int]]: points joining the root to the nearest cell of 3 edges (fork) or 2 corners (bridge),
+        empty if the group does not form the structure
+    '''
+    ids, needed = (geometry.edge, 3) if way == "fork" else (geometry.corner, 2)
+    ends = {}
+    for cell in parents:
+        if ids[cell] != -1 and ids[cell] not in ends:
+            ends[ids[cell]] = cell
+            if len(ends) == needed:
+                break
+    if len(ends) < needed:
+        return []
+
+    # First branch from its end to the root, the other ones from the root to their ends
+    ends = list(ends.values())
+    cells = trace_back(parents, ends[0])
+    seen = set(cells)
+    for end in ends[1:]:
+        for cell in reversed(trace_back(parents, end)):
+            if cell not in seen:
+                seen.add(cell)
+                cells.append(cell)
+    return [geometry.coords[cell] for cell in cells]
 
 
 def find_ring(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]]:
@@ -338,47 +381,15 @@ def find_ring(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]]:
 
     # Parameters
     board (numpy array[bool]): Game board with True values at the positions of the player and False elsewhere
-    start (Tuple[int, int]): Starting point for the DFS
+    start (Tuple[int, int]): Starting point of the search
 
     # Returns
-    List[Tuple[int, int]]: Set of points forming the bridge, via direct neighbours
-    '''
-
-    dim = board.shape[0]
-    siz = dim // 2  # to determine the half of the board
-    directions = ["up", "top-left", "bottom-left", "down"]
-
-    def dfs(board, vertex, direction, visited, path, ring_length):
-        if vertex == start and ring_length >= 5:
-            return True
-
-        x, y = vertex
-        half = np.sign(y - siz)
-        new_directions = three_forward_moves(direction)
-        for new_dir in new_directions:
-            direction_coors = move_coordinates(new_dir, half)
-            nx, ny = x + direction_coors[0], y + direction_coors[1]
-            if is_valid(nx, ny, dim) and board[nx, ny] and (nx, ny, new_dir) not in visited:
-                visited.add((nx, ny, new_dir))
-                if dfs(board, (nx, ny), new_dir, visited, path, ring_length + 1):
-                    path.append(vertex)
-                    return True
-                
-        return False
-
-    visited = set()
-    for direction in directions:
-        x, y = start
-        half = np.sign(y - siz)  # 0 for mid, -1 for left, 1 for right
-        direction_coors = move_coordinates(direction, half)
-        nx, ny = x + direction_coors[0], y + direction_coors[1]
-        if is_valid(nx, ny, dim) and board[nx, ny] and (nx, ny, direction) not in visited:
-            visited.add((nx, ny, direction))
-            child_path = [start]
-            if dfs(board, (nx, ny), direction, visited, child_path, 0):
-                return child_path
-
-    return []
+    List[Tuple[int, int]]: Points forming the ring, in order along the ring, empty if there is none
+    '''
+    geometry = get_geometry(board.shape[0])
+    path = []
+    ring_search(geometry.pad(board).tolist(), True, geometry, geometry.index(*start), path)
+    return path
 
 
 def find_fork(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]]:
@@ -387,53 +398,14 @@ def find_fork(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]]:
     
     # Parameters
     board (numpy array[bool]): Game board with True values at the positions of the player and False elsewhere
-    start (Tuple[int, int]): Starting point for the DFS
+    start (Tuple[int, int]): Starting point of the search
 
     # Returns
-    List[Tuple[int, int]]: Set of points forming the bridge, via direct neighbours
+    List[Tuple[int, int]]: Points forming the fork, via direct neighbours, empty if there is none
     '''
-    
-    dim = board.shape[0]
-
-    def dfs(board, vertex, visited, path, edges, vis_edge_cnt):
-        edge = get_edge(vertex, dim)
-        if edge != -1:
-            if edge not in edges:
-                path.append(vertex)
-                edges.append(edge)
-            if len(edges) - vis_edge_cnt > 1:
-                return
-
-        for nx, ny in get_neighbours(dim, vertex):
-            if is_valid(nx, ny, dim) and (nx, ny) not in visited and board[nx, ny]:
-                visited.add((nx, ny))
-                num_edges = len(edges)
-                dfs(board, (nx, ny), visited, path, edges, vis_edge_cnt)
-                if len(edges) > num_edges:
-                    path.append(vertex)
-                if len(edges) - vis_edge_cnt > 1:
-                    return
-
-        return
-
-    path = [start]
-    visited_edges = []
-    edge = get_edge(start, dim)
-    if edge != -1:
-        visited_edges.append(edge)
-    visited = set()
-    visited.add(start)
-    for nx, ny in get_neighbours(dim, start):
-        if is_valid(nx, ny, dim) and board[nx, ny]:
-            child_path = []
-            num_edges = len(visited_edges)
-            dfs(board, (nx, ny), visited, child_path, visited_edges, num_edges)
-            if len(visited_edges) > num_edges:
-                path.extend(child_path)
-            if len(visited_edges) > 2:
-                return path
-
-    return path
+    geometry = get_geometry(board.shape[0])
+    parents = group_tree(geometry.pad(board).tolist(), True, geometry, geometry.index(*start))
+    return structure_path(parents, geometry, "fork")
 
 
 def find_bridge(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]]:
@@ -442,48 +414,14 @@ def find_bridge(board: np.array, start: Tuple[int, int]) -> List[Tuple[int, int]
     
     # Parameters
     board (numpy array[bool]): Game board with True values at the positions of the player and False elsewhere
-    start (Tuple[int, int]): Starting point for the DFS
+    start (Tuple[int, int]): Starting point of the search
 
     # Returns
-    List[Tuple[int, int]]: Set of points forming the bridge, via direct neighbours
+    List[Tuple[int, int]]: Points forming the bridge from one corner to the other, empty if there is none
     '''
-    
-    dim = board.shape[0]
-    
-    def dfs(board, vertex, visited, path):
-        corner = get_corner(vertex, dim)
-        if corner != -1:
-            path.append(vertex)
-            return corner
-
-        corner = -1
-        for nx, ny in get_neighbours(dim, vertex):
-            if is_valid(nx, ny, dim) and (nx, ny) not in visited and board[nx, ny]:
-                visited.add((nx, ny))
-                corner = dfs(board, (nx, ny), visited, path)
-                if corner != -1:
-                    path.append(vertex)
-                    break
-
-        return corner
-
-    path = [start]
-    visited_corner = get_corner(start, dim)
-    visited = set()
-    visited.add(start)
-    for nx, ny in get_neighbours(dim, start):
-        if is_valid(nx, ny, dim) and board[nx, ny]:
-            child_path = []
-            visited.add((nx, ny))
-            corner = dfs(board, (nx, ny), visited, child_path)
-            if corner != -1 and corner != visited_corner:
-                path.extend(child_path)
-                if visited_corner == -1:
-                    visited_corner = corner
-                else:
-                    return path
-
-    return path
+    geometry = get_geometry(board.shape[0])
+    parents = group_tree(geometry.pad(board).tolist(), True, geometry, geometry.index(*start))
+    return structure_path(parents, geometry, "bridge")
 
 
 # Marked (node, incoming direction) visited!
@@ -499,53 +437,107 @@ def check_ring(board: np.array, move: Tuple[int, int]) -> bool:
     bool: True if a ring is formed by the move, False otherwise
     '''
     # board is already a numpy boolean array, we are only concerned with "true" paths
-    # DFS at <move> to check whether ring forms
-    dim = board.shape[0]  # of the array
-    siz = dim // 2  # to determine the half of the board
-    init_move = move
-    directions = ["up", "top-left", "bottom-left", "down"]
-    visited = set()
+    geometry = get_geometry(board.shape[0])
 
     # Trivially false if less than 2 True neighbours present
-    neighbours = get_neighbours(dim, move)
-    neighbours = [board[neighbour] for neighbour in neighbours]
-    if neighbours.count(True) < 2:
+    if sum(board[neighbour] for neighbour in geometry.neighbour_coords[move]) < 2:
+        return False
+
+    return ring_search(geometry.pad(board).tolist(), True, geometry, geometry.index(*move))
+
+
+def ring_search(cells: List[int], player_num: int, geometry, start: int, path: List[Tuple[int, int]] = None) -> bool:
+    '''
+    Searches for a ring through `start` on a flat padded board (see `geometry`)
+
+    # Parameters
+    cells (List[int]): padded board, cells equal to `player_num` belong to the player
+    player_num (int): value of the player's cells
+    geometry (Geometry): geometry tables of the board
+    start (int): flat index of the move. Must have already been played
+    path (List[Tuple[int, int]]): if not None and a ring is found, overwritten by the points of the ring
+
+    # Returns
+    bool: True if a ring passes through `start`, False otherwise
+    '''
+    # BFS over (cell, incoming direction) states at <start> to check whether ring forms
+    steps = geometry.steps
+    if sum(cells[neighbour] == player_num for neighbour in geometry.neighbours[start]) < 2:
         return False
 
+    # States are encoded as cell * 6 + incoming direction, and mapped to the state they were reached from
     # In the first step, move in 4 contiguous directions (4 suffices to detect a ring)
+    parents = {}
     exploration = []
-    for direction in directions:
-        x, y = move
-        half = np.sign(move[1] - siz)  # 0 for mid, -1 for left, 1 for right
-        direction_coors = move_coordinates(direction, half)
-        nx, ny = x + direction_coors[0], y + direction_coors[1]
-        if 0 <= nx < dim and 0 <= ny < dim and board[nx, ny]:
-            exploration.append(((nx, ny), direction))
-            visited.add((nx, ny, direction))
+    for direction in (UP, TOP_LEFT, BOTTOM_LEFT, DOWN):
+        cell = start + steps[start][direction]
+        if cells[cell] == player_num:
+            exploration.append((cell, direction))
+            parents[cell * 6 + direction] = None
 
     ring_length = 1
     # In the later steps, move in 3 "forward" directions (avoids sharp turns)
-    while (len(exploration) != 0):
+    while exploration:
         new_exp = []
-        for to_explore in exploration:
-            move, prev_direction = to_explore
-            x, y = move
-            half = np.sign(y - siz)
-            new_directions = three_forward_moves(prev_direction)
-            for direction in new_directions:
-                direction_coors = move_coordinates(direction, half)
-                nx, ny = x + direction_coors[0], y + direction_coors[1]
-                if is_valid(nx, ny, dim) and board[nx, ny] and (nx, ny, direction) not in visited:
-                    if init_move == (nx, ny) and ring_length >= 5:
-                        # print(f"Ring passing through {init_move} detected!")
+        for cell, prev_direction in exploration:
+            offsets = steps[cell]
+            for direction in FORWARD[prev_direction]:
+                nxt = cell + offsets[direction]
+                if cells[nxt] == player_num and nxt * 6 + direction not in parents:
+                    if nxt == start and ring_length >= 5:
+                        if path is not None:
+                            ring = [start] + [state // 6 for state in reversed(trace_back(parents, cell * 6 + prev_direction))]
+                            path.clear()
+                            path.extend(geometry.coords[cell] for cell in dict.fromkeys(ring))
                         return True
-                    new_exp.append(((nx, ny), direction))
-                    visited.add((nx, ny, direction))
+                    new_exp.append((nxt, direction))
+                    parents[nxt * 6 + direction] = cell * 6 + prev_direction
         exploration = new_exp
         ring_length += 1
     return False
 
 
+def surrounds_neighbour(cells: List[int], player_num: int, geometry, start: int) -> bool:
+    '''
+    Whether a stone at `start` completes the six stones around one of its neighbours that is itself
+    a stone of the player: the smallest ring, made of three neighbours of `start` next to each other
+
+    # Parameters
+    cells (List[int]): padded board, cells equal to `player_num` belong to the player. `start` counts as one.
+    player_num (int): value of the player's cells
+    geometry (Geometry): geometry tables of the board
+    start (int): flat index of the move
+
+    # Returns
+    bool: True if a neighbour of `start` is enclosed by stones of the player, False otherwise
+    '''
+    around = geometry.around
+    start_around = around[start]
+    for index in range(6):
+        # around[index - 5] is the neighbour after around[index], clockwise
+        if cells[start_around[index]] == player_num and cells[start_around[index - 1]] == player_num \
+                and cells[start_around[index - 5]] == player_num:
+            if all(cell == start or cells[cell] == player_num for cell in around[start_around[index]]):
+                return True
+    return False
+
+
+def group_masks(board: np.array, move: Tuple[int, int]) -> Tuple[int, int]:
+    '''
+    Returns the corners and edges touched by the group containing the move, as bitmasks
+
+    # Parameters
+    board (numpy array[bool]): game board with True values at the positions of the player and False elsewhere
+    move (Tuple[int, int]): position of the move. Must have already been played (marked on the board)
+
+    # Returns
+    Tuple[int, int]: Bitmask of the corners (bit i for corner i) and bitmask of the edges (bit i for edge i)
+    '''
+    masks = get_masks(board.shape[0])
+    start = 1 << int(masks.geometry.index(*move))
+    return masks.touched(masks.flood_fill(start, to_mask(board) | start))
+
+
 def check_bridge(board: np.array, move: Tuple[int, int]) -> bool:
     '''
     Check whether a bridge is formed by the move, via direct neighbours
@@ -557,15 +549,8 @@ def check_bridge(board: np.array, move: Tuple[int, int]) -> bool:
     # Returns
     bool: True if a bridge is formed by the move, False otherwise
     '''
-    visited = bfs_reachable(board, move)
-    dim     = board.shape[0]
-    corners = set(get_all_corners(dim))
-
-    ## check for bridge
-    reachable_corners = len([corner for corner in corners if corner in visited])
-    if reachable_corners >= 2:
-        return True
-    return False
+    corners, _ = group_masks(board, move)
+    return BIT_COUNT[corners] >= 2
 
 
 def check_fork(board: np.array, move: Tuple[int, int]) -> bool:
@@ -579,17 +564,8 @@ def check_fork(board: np.array, move: Tuple[int, int]) -> bool:
     # Returns
     bool: True if a fork is formed by the move, False otherwise
     '''
-    visited = bfs_reachable(board, move)
-    dim     = board.shape[0]
-    sides   = get_all_edges(dim)
-    sides   = [set(side) for side in sides]
-
-    ## check for fork
-    reachable_edges = [1 if len(side.intersection(visited)) > 0 else 0 for side in sides]
-    if sum(reachable_edges) >= 3:
-        return True
-
-    return False
+    _, edges = group_masks(board, move)
+    return BIT_COUNT[edges] >= 3
 
 
 def check_fork_and_bridge(board: np.array, move: Tuple[int, int]) -> Tuple[bool, Union[str, None]]:
@@ -603,22 +579,14 @@ def check_fork_and_bridge(board: np.array, move: Tuple[int, int]) -> Tuple[bool,
     # Returns
     bool: True if a fork or a bridge is formed by the move, False otherwise
     '''
-    visited = bfs_reachable(board, move)
-    dim     = board.shape[0]
-    corners = set(get_all_corners(dim))
-    sides = get_all_edges(dim)
-    sides = [set(side) for side in sides]
+    corners, edges = group_masks(board, move)
 
     # check for fork
-    reachable_edges = [1 if len(side.intersection(visited)) > 0 else 0 for side in sides]
-    if sum(reachable_edges) >= 3:
-        # print("Fork Detected!")
+    if BIT_COUNT[edges] >= 3:
         return True, "fork"
 
     # check for bridge
-    reachable_corners = len([corner for corner in corners if corner in visited])
-    if reachable_corners >= 2:
-        # print("Bridge Detected!")
+    if BIT_COUNT[corners] >= 2:
         return True, "bridge"
 
     return False, None
@@ -642,21 +610,374 @@ def check_win(board: np.array, move: Tuple[int, int], player_num: int, path:List
     # Invariant : Win can only be induced through a structure formed at <move> by <player_num>
     # All paths for player_num are set to "True", no other information needed, hence encoded as a lighweight boolean array
     board = (board == player_num)
-    if check_ring(board, move):
-        if path != None:
-            path.clear()
-            path.extend(find_ring(board, move))
+    if path is None:
+        if check_ring(board, move):
+            return True, "ring"
+        return check_fork_and_bridge(board, move)
+
+    # The searches that detect the structures also record how to extract them
+    geometry = get_geometry(board.shape[0])
+    cells = geometry.pad(board).tolist()
+    return win_with_path(cells, True, geometry, geometry.index(*move), path)
+
+
+def win_with_path(cells: List[int], player_num: int, geometry, start: int, path: List[Tuple[int, int]]) -> Tuple[bool, Union[str, None]]:
+    '''
+    Checks for a win through `start` on a flat padded board, extracting the winning path in the same pass
+
+    # Parameters
+    cells (List[int]): padded board, cells equal to `player_num` belong to the player
+    player_num (int): value of the player's cells
+    geometry (Geometry): geometry tables of the board
+    start (int): flat index of the move. Must have already been played
+    path (List[Tuple[int, int]]): overwritten by the winning path if the player has won
+
+    # Returns
+    Tuple[bool, Union[str, None]]: Whether the player has won, and the structure formed
+    '''
+    if ring_search(cells, player_num, geometry, start, path):
         return True, "ring"
-    
-    win, way = check_fork_and_bridge(board, move)
-    if win:
-        if way == "fork":
-            if path != None:
-                path.clear()
-                path.extend(find_fork(board, move))
-        elif way == "bridge":
-            if path != None:
-                path.clear()
-                path.extend(find_bridge(board, move))
-        return True, way
-    return False, None
+
+    parents = group_tree(cells, player_num, geometry, start)
+    corners = edges = 0
+    for cell in parents:
+        corners |= geometry.corner_bit[cell]
+        edges |= geometry.edge_bit[cell]
+    way = "fork" if BIT_COUNT[edges] >= 3 else "bridge" if BIT_COUNT[corners] >= 2 else None
+    if way is None:
+        return False, None
+    path.clear()
+    path.extend(structure_path(parents, geometry, way))
+    return True, way
+
+
+class UnionFind:
+    '''
+    Disjoint-set forest over the cells of the board for a single player.
+    Every root carries the bitmask of the corners and edges touched by its group.
+
+    # Parameters
+    `size (int)`: Number of cells of the (flattened) board
+    '''
+    __slots__ = ('parent', 'rank', 'corners', 'edges')
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+        self.corners = [0] * size
+        self.edges = [0] * size
+
+    def find(self, cell: int) -> int:
+        '''
+        Returns the root of the group containing `cell`, compressing the path on the way
+        '''
+        parent = self.parent
+        root = cell
+        while parent[root] != root:
+            root = parent[root]
+        while parent[cell] != root:
+            parent[cell], cell = root, parent[cell]
+        return root
+
+    def union(self, a: int, b: int) -> int:
+        '''
+        Merges the groups containing `a` and `b` (union by rank) and returns the new root
+        '''
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+        self.corners[ra] |= self.corners[rb]
+        self.edges[ra] |= self.edges[rb]
+        return ra
+
+    def copy(self) -> 'UnionFind':
+        clone = UnionFind.__new__(UnionFind)
+        clone.parent = self.parent[:]
+        clone.rank = self.rank[:]
+        clone.corners = self.corners[:]
+        clone.edges = self.edges[:]
+        return clone
+
+
+class ConnectivityTracker:
+    '''
+    Incrementally maintains the groups of both players, so that forks and bridges
+    can be detected in O(α(n)) per placement instead of a flood fill per move.
+
+    Rings are detected incrementally too: a ring through a new stone leaves it through one
+    neighbour and comes back through another, so it can only exist if two of its neighbours
+    were already in the same group. Neighbours next to each other around the stone do not count:
+    a ring through both would have been a ring without the stone, unless it only encloses the
+    stone between them (see `surrounds_neighbour`). Only in that case, or when two runs of
+    neighbours separated by other cells share a group, is the full ring search of `check_ring` run.
+    (`check_ring` also reports a stone merely touching a ring that was closed earlier, which
+    cannot happen in a game since that ring already ended it.)
+
+    `hash` is the Zobrist key of the stones on the board, updated with every move, so that
+    the same stones reached in a different order give the same key.
+
+    # Parameters
+    `board (numpy array)`: Game board (0 empty, 1/2 players, 3 blocked). It is copied.
+    '''
+
+    def __init__(self, board: np.array):
+        self.dim = board.shape[0]
+        self.board = board.copy()
+        self.geometry = get_geometry(self.dim)
+        self.cells = self.geometry.pad(board).tolist()
+        self.groups = [None, UnionFind(self.geometry.area), UnionFind(self.geometry.area)]
+        stones = [(cell, value) for cell, value in enumerate(self.cells) if value == 1 or value == 2]
+        for cell, value in stones:
+            self.groups[value].corners[cell] = self.geometry.corner_bit[cell]
+            self.groups[value].edges[cell] = self.geometry.edge_bit[cell]
+        for cell, value in stones:
+            self._link(cell, value)
+        self.hash = 0
+        for cell, value in stones:
+            self.hash ^= self.geometry.zobrist[value][cell]
+        self.last_move = None
+        self.ring_candidate = False
+
+    def _closes_loop(self, cell: int, player_num: int) -> bool:
+        '''
+        Whether two runs of stones of `player_num` around `cell`, separated by other cells, already belong
+        to the same group. Stones of one run touch each other, so their sharing a group proves nothing,
+        except when the stone closes the ring around the middle one of them (`surrounds_neighbour`).
+        '''
+        groups = self.groups[player_num]
+        cells = self.cells
+        around = self.geometry.around[cell]
+        runs = []
+        in_run = cells[around[-1]] == player_num  # A run across the last and first neighbours starts before them
+        for neighbour in around:
+            if cells[neighbour] != player_num:
+                in_run = False
+            elif not in_run:
+                in_run = True
+                root = groups.find(neighbour)
+                if root in runs:
+                    return True
+                runs.append(root)
+        return surrounds_neighbour(cells, player_num, self.geometry, cell)
+
+    def _link(self, cell: int, player_num: int) -> int:
+        groups = self.groups[player_num]
+        cells = self.cells
+        for neighbour in self.geometry.neighbours[cell]:
+            if cells[neighbour] == player_num:
+                groups.union(cell, neighbour)
+        return groups.find(cell)
+
+    def play(self, move: Tuple[int, int], player_num: int) -> None:
+        '''
+        Places a stone of `player_num` at `move` and merges it with the adjacent groups
+
+        # Parameters
+        `move (Tuple[int, int])`: Position of the move, must be empty
+        `player_num (int)`: Id of the player who made the move
+        '''
+        self.board[move] = player_num
+        cell = self.geometry.index(*move)
+        self.cells[cell] = player_num
+        self.hash ^= self.geometry.zobrist[player_num][cell]
+        self.last_move = cell
+        self.ring_candidate = self._closes_loop(cell, player_num)
+        groups = self.groups[player_num]
+        groups.corners[cell] = self.geometry.corner_bit[cell]
+        groups.edges[cell] = self.geometry.edge_bit[cell]
+        self._link(cell, player_num)
+
+    def check_win(self, move: Tuple[int, int], player_num: int, path: List[Tuple[int, int]] = None) -> Tuple[bool, Union[str, None]]:
+        '''
+        Same contract as `check_win`, on the tracked board. The move must have been played with `play`.
+
+        # Parameters
+        `move (Tuple[int, int])`: Position of the move
+        `player_num (int)`: Id of the player who made the move
+        `path (List[Tuple[int, int]])`: If not None, overwritten by the winning path
+
+        # Returns
+        Tuple[bool, Union[str, None]]: Whether the player has won, and the structure formed
+        '''
+        cell = self.geometry.index(*move)
+        if cell != self.last_move or self.ring_candidate:
+            if ring_search(self.cells, player_num, self.geometry, cell, path):
+                return True, "ring"
+
+        groups = self.groups[player_num]
+        root = groups.find(cell)
+        way = None
+        if BIT_COUNT[groups.edges[root]] >= 3:
+            way = "fork"
+        elif BIT_COUNT[groups.corners[root]] >= 2:
+            way = "bridge"
+        if way is not None and path != None:
+            path.clear()
+            path.extend(structure_path(group_tree(self.cells, player_num, self.geometry, cell), self.geometry, way))
+        return way is not None, way
+
+    def winning_moves(self, player_num: int) -> Dict[Tuple[int, int], str]:
+        '''
+        Returns every empty cell where a stone of `player_num` would win at once, in a single pass
+        over the cells using the groups of the current position (the board is not copied)
+
+        # Parameters
+        `player_num (int)`: Id of the player
+
+        # Returns
+        Dict[Tuple[int, int], str]: Winning cells in row-major order, mapped to the structure formed
+        '''
+        geometry = self.geometry
+        around = geometry.around
+        groups = self.groups[player_num]
+        cells = self.cells
+        wins = {}
+        for cell in geometry.cells:
+            if cells[cell] != 0:
+                continue
+            corners = geometry.corner_bit[cell]
+            edges = geometry.edge_bit[cell]
+            roots = []
+            runs = []
+            ring_candidate = False
+            # Only two separate runs of neighbours in the same group, or a surrounded neighbour, can close a ring (see `_closes_loop`)
+            in_run = cells[around[cell][-1]] == player_num
+            for neighbour in around[cell]:
+                if cells[neighbour] != player_num:
+                    in_run = False
+                    continue
+                root = groups.find(neighbour)
+                if not in_run:
+                    in_run = True
+                    if root in runs:
+                        ring_candidate = True
+                    runs.append(root)
+                if root not in roots:
+                    roots.append(root)
+                    corners |= groups.corners[root]
+                    edges |= groups.edges[root]
+            if not roots:
+                continue
+
+            if ring_candidate or surrounds_neighbour(cells, player_num, geometry, cell):
+                cells[cell] = player_num
+                ring = ring_search(cells, player_num, geometry, cell)
+                cells[cell] = 0
+                if ring:
+                    wins[geometry.coords[cell]] = "ring"
+                    continue
+            if BIT_COUNT[edges] >= 3:
+                wins[geometry.coords[cell]] = "fork"
+            elif BIT_COUNT[corners] >= 2:
+                wins[geometry.coords[cell]] = "bridge"
+        return wins
+
+    def playout(self, player_num: int, rng=random, order: List[int] = None) -> Tuple[int, int]:
+        '''
+        Plays a random game to the end from the tracked position, without modifying the tracker.
+        The empty cells are shuffled once and filled alternately, then the sequence is replayed
+        through a scratch copy of the union-find to find the first move completing a structure.
+
+        # Parameters
+        `player_num (int)`: Id of the player to move
+        `rng`: Source of randomness with a `shuffle` method (the `random` module by default)
+        `order (List[int])`: Flat indices of the empty cells in playing order. Shuffled from
+            the empty cells of the position if not given.
+
+        # Returns
+        Tuple[int, int]: Winner (0 for a draw), and number of moves played
+        '''
+        geometry = self.geometry
+        cells = self.cells[:]
+        if order is None:
+            order = [cell for cell in geometry.cells if cells[cell] == 0]
+            rng.shuffle(order)
+        around = geometry.around
+        corner_bit = geometry.corner_bit
+        edge_bit = geometry.edge_bit
+        parents = [None, self.groups[1].parent[:], self.groups[2].parent[:]]
+        corners = [None, self.groups[1].corners[:], self.groups[2].corners[:]]
+        edges = [None, self.groups[1].edges[:], self.groups[2].edges[:]]
+
+        player = player_num
+        for length, cell in enumerate(order, 1):
+            cells[cell] = player
+            parent = parents[player]
+            group_corners = corners[player]
+            group_edges = edges[player]
+            cell_corners = corner_bit[cell]
+            cell_edges = edge_bit[cell]
+            roots = []
+            runs = []
+            ring_candidate = False
+            cell_around = around[cell]
+            in_run = cells[cell_around[5]] == player
+            stones = 0
+            for neighbour in cell_around:
+                if cells[neighbour] != player:
+                    in_run = False
+                    continue
+                stones += 1
+                # Find with path halving
+                root = neighbour
+                while parent[root] != root:
+                    parent[root] = parent[parent[root]]
+                    root = parent[root]
+                if not in_run:
+                    # A new run of neighbours: a ring needs two runs in the same group
+                    in_run = True
+                    if root in runs:
+                        ring_candidate = True
+                    runs.append(root)
+                if root not in roots:
+                    roots.append(root)
+                    cell_corners |= group_corners[root]
+                    cell_edges |= group_edges[root]
+            # The new stone becomes the root of the merged group
+            for root in roots:
+                parent[root] = cell
+            group_corners[cell] = cell_corners
+            group_edges[cell] = cell_edges
+
+            if BIT_COUNT[cell_edges] >= 3 or BIT_COUNT[cell_corners] >= 2:
+                return player, length
+            if ring_candidate or (stones >= 3 and surrounds_neighbour(cells, player, geometry, cell)):
+                if ring_search(cells, player, geometry, cell):
+                    return player, length
+            player = 3 - player
+        return 0, len(order)
+
+    def copy(self) -> 'ConnectivityTracker':
+        '''
+        Returns an independent copy of the tracker, sharing the read-only board tables
+        '''
+        clone = ConnectivityTracker.__new__(ConnectivityTracker)
+        clone.dim = self.dim
+        clone.board = self.board.copy()
+        clone.geometry = self.geometry
+        clone.cells = self.cells[:]
+        clone.groups = [None, self.groups[1].copy(), self.groups[2].copy()]
+        clone.hash = self.hash
+        clone.last_move = self.last_move
+        clone.ring_candidate = self.ring_candidate
+        return clone
+
+
+def get_winning_moves(board: np.array) -> Dict[int, Dict[Tuple[int, int], str]]:
+    '''
+    Returns the cells where each player would win immediately by placing a stone
+
+    # Parameters
+    board (numpy array): Game board
+
+    # Returns
+    Dict[int, Dict[Tuple[int, int], str]]: For players 1 and 2, the winning cells in row-major order
+        mapped to the structure formed ("ring", "fork" or "bridge"), as `check_win` would report it
+    '''
+    tracker = ConnectivityTracker(board)
+    return {1: tracker.winning_moves(1), 2: tracker.winning_moves(2)}
@@ -0,0 +1,87 @@
+import os
+import json
+import time
+from typing import Callable
+
+# Written next to `logs.txt`, in the directory the game is run from
+STATS_FILE = 'stats.jsonl'
+
+
+class SearchStats:
+    '''
+    Counters and timers of the search of one move. Only created when instrumentation is enabled,
+    the search loops skip all the bookkeeping when they get None instead.
+    '''
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.iterations = 0
+        self.playouts = 0
+        self.max_depth = 0
+        self.timers = {'tree_policy': 0.0, 'rollout': 0.0, 'backpropagate': 0.0, 'check_win': 0.0}
+        self.calls = {name: 0 for name in self.timers}
+        self.fields = {}  # Values describing the outcome of the search (tree size, confidence), set by the search
+
+    def time(self, name: str, function: Callable, *args, **kwargs):
+        '''
+        Calls `function(*args, **kwargs)`, adding its duration to the timer `name`, and returns its result
+        '''
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.timers[name] += time.perf_counter() - start
+        self.calls[name] += 1
+        return result
+
+    def iteration(self, depth: int, playouts: int) -> None:
+        '''
+        Counts one iteration of the search, that reached `depth` and ran `playouts` playouts
+        '''
+        self.iterations += 1
+        self.playouts += playouts
+        self.max_depth = max(self.max_depth, depth)
+
+    def record(self) -> dict:
+        '''
+        Returns the counters and timers as a JSON-serialisable dictionary
+        '''
+        elapsed = time.perf_counter() - self.started
+        return {
+            'elapsed': round(elapsed, 6),
+            'iterations': self.iterations,
+            'playouts': self.playouts,
+            'playouts_per_sec': round(self.playouts / elapsed, 1) if elapsed > 0 else 0.0,
+            'max_depth': self.max_depth,
+            'timers': {name: round(seconds, 6) for name, seconds in self.timers.items()},
+            'calls': dict(self.calls),
+            **self.fields,
+        }
+
+
+class StatsWriter:
+    '''
+    Streams the statistics of every move as JSON lines
+
+    # Parameters
+    `path (str)`: File appended to, `STATS_FILE` in the current directory by default
+    '''
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.getcwd(), STATS_FILE)
+
+    def start(self) -> SearchStats:
+        '''
+        Returns the statistics of a move whose search starts now
+        '''
+        return SearchStats()
+
+    def write(self, stats: SearchStats, **fields) -> None:
+        '''
+        Appends one line with the statistics of a move and the given extra fields
+
+        # Parameters
+        `stats (SearchStats)`: Statistics of the move
+        `fields`: JSON-serialisable values describing the move (player, move, source, tree size, ...)
+        '''
+        record = {'time': time.time(), **fields, **stats.record()}
+        with open(self.path, 'a') as file:
+            file.write(json.dumps(record) + '\n')
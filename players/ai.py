@@ -2,172 +2,893 @@ import time
 import math
 import random
 import numpy as np
+import multiprocessing as mp
+from functools import lru_cache
 from helper import *
+from geometry import get_geometry
+from timing import TimeManager
+from book import load_book
+from solver import ProofNumberSolver, WIN, LOSS
+from instrumentation import SearchStats
+from collections import OrderedDict
+from typing import Callable
 
-class Node:
-    def __init__(self, state, parent=None, move=None):
-        self.state = state
-        self.parent = parent
-        self.children = []
-        self.visits = 0
-        self.value = 0
-        self.move = move
-        self.terminal_node = False
-        self.rave_visits = {}
-        self.rave_value = {}
-
-    def is_fully_expanded(self) -> bool:
-        """Checks if all possible actions from the current state have been expanded."""
-        return len(self.children) == len(get_valid_actions(self.state))
-
-    def best_child(self, c=1.41, beta_func=None) -> 'Node':
-        """Select the child node with the highest combined UCT-RAVE score."""
-        def uct_rave_value(child):
-            if child.visits == 0:
-                return float('inf')
-
-            # UCT value (exploitation + exploration)
-            exploitation = child.value / child.visits
-            exploration = c * math.sqrt(math.log(self.visits) / child.visits)
-            uct_value = exploitation + exploration
-
-            # RAVE value
-            rave_visits = self.rave_visits.get(child.move, 0)
-            rave_value = self.rave_value.get(child.move, 0) / rave_visits if rave_visits > 0 else 0
-
-            # Weight the combination of UCT and RAVE values
-            beta = beta_func(child) if beta_func else rave_visits / (child.visits + rave_visits + 1)
-            return (1 - beta) * uct_value + beta * rave_value
-
-        return max(self.children, key=uct_rave_value)
-
-    def update_rave(self, move: Tuple[int, int], outcome: float) -> None:
-        """Update RAVE statistics for an action."""
-        if move not in self.rave_visits:
-            self.rave_visits[move] = 0
-            self.rave_value[move] = 0
-        self.rave_visits[move] += 1
-        self.rave_value[move] += outcome
-
-    def add_child(self, move: Tuple[int, int], state: np.array) -> 'Node':
-        """Add a child node for a given move and state."""
-        child_node = Node(state=state, parent=self, move=move)
-        self.children.append(child_node)
-        return child_node
-
-def beta_func(child: Node, k=500) -> float:
-    """RAVE weight function based on the number of visits to a child node."""
-    return k / (k + child.visits)
-
-def mcts(state: np.array, timer_per_move: float, player_number: int, target_depth=3, num_rollouts=10) -> Tuple[int, int]:
-    """Monte Carlo Tree Search with RAVE, including one-step win and block moves."""
-    
+class TranspositionTable:
+    """Visits and value of the positions met by the search, keyed by Zobrist hash, shared by all the nodes
+    reaching the same stones in a different order. Bounded: the least recently used position is evicted."""
+
+    def __init__(self, capacity: int = 1 << 17):
+        self.capacity = capacity
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+        self.visits = np.zeros(capacity, dtype=np.float64)
+        self.value = np.zeros(capacity, dtype=np.float64)
+        self.slots = OrderedDict()  # Key -> slot, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, key: int, visits: float = 0, value: float = 0) -> int:
+        """Slot of a position, added with the given statistics if it is not in the table."""
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.hits += 1
+            self.slots.move_to_end(key)
+            return slot
+        self.misses += 1
+        if len(self.slots) < self.capacity:
+            slot = len(self.slots)
+        else:
+            _, slot = self.slots.popitem(last=False)
+            self.evictions += 1
+        self.slots[key] = slot
+        self.keys[slot] = key
+        self.visits[slot] = visits
+        self.value[slot] = value
+        return slot
+
+    def touch(self, key: int) -> None:
+        """Marks a position of the table as just used."""
+        self.slots.move_to_end(key)
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of the lookups that found their position already in the table."""
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def stats(self) -> Dict[str, float]:
+        """Size, capacity, hits, misses, evictions and hit rate of the table."""
+        return {'size': len(self.slots), 'capacity': self.capacity, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate}
+
+class Tree:
+    """MCTS tree stored as growable NumPy arrays indexed by node id, node 0 being the root."""
+
+    ARRAYS = (('visits', np.float64), ('value', np.float64),
+              ('parent', np.int32), ('first_child', np.int32), ('next_sibling', np.int32),
+              ('move', np.int32), ('player', np.int8), ('terminal', np.bool_), ('amaf_row', np.int32),
+              ('key', np.uint64), ('slot', np.int32), ('num_children', np.int32))
+
+    def __init__(self, state: np.array, player_number: int, capacity: int = 1024, full_amaf: bool = True, table: TranspositionTable = None,
+                 widening: bool = True):
+        self.state = state.copy()
+        self.player_number = player_number
+        self.dim = state.shape[0]
+        self.tracker = ConnectivityTracker(state)
+        # Statistics shared by the nodes of the same position, if any
+        self.table = table
+        self.size = 0
+        for name, dtype in self.ARRAYS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        # All-moves-as-first statistics of the nodes having children, one row per node indexed by cell id
+        self.full_amaf = full_amaf
+        self.rows = 0
+        self.amaf_visits = np.zeros((max(capacity // 8, 1), self.dim * self.dim), dtype=np.float32)
+        self.amaf_value = np.zeros_like(self.amaf_visits)
+        # Progressive widening: a node gets children one at a time, best prior first, as its visits grow
+        self.widening = widening
+        self.untried = []   # Untried moves of every node, best prior last, built on first use
+        self.children = []  # Children ids of every node, cached until it gets a new child
+        self.stats = None   # Statistics of the running search, when it is instrumented
+        # The root "was played" by the opponent of the player to move
+        self.add_node(-1, -1, 3 - player_number, key=self.tracker.hash)
+
+    def grow(self) -> None:
+        """Doubles the capacity of the node arrays."""
+        for name, _ in self.ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros(2 * len(old), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def new_row(self) -> int:
+        """Allocates a zeroed row of AMAF statistics, returns its index."""
+        if self.rows == len(self.amaf_visits):
+            for name in ('amaf_visits', 'amaf_value'):
+                old = getattr(self, name)
+                new = np.zeros((2 * len(old), old.shape[1]), dtype=old.dtype)
+                new[:self.rows] = old[:self.rows]
+                setattr(self, name, new)
+        row = self.rows
+        self.rows += 1
+        self.amaf_visits[row] = self.amaf_value[row] = 0
+        return row
+
+    def add_node(self, parent: int, move: int, player: int, terminal: bool = False, key: int = 0) -> int:
+        """Appends a node reached from `parent` by `player` playing the cell `move`, whose position has the Zobrist key `key`, returns its id."""
+        if self.size == len(self.visits):
+            self.grow()
+        node = self.size
+        self.size += 1
+        self.visits[node] = self.value[node] = 0
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.next_sibling[node] = -1
+        self.move[node] = move
+        self.player[node] = player
+        self.terminal[node] = terminal
+        self.amaf_row[node] = -1
+        self.key[node] = key
+        self.slot[node] = self.table.lookup(key) if self.table is not None else -1
+        self.num_children[node] = 0
+        self.untried.append(None)
+        self.children.append(None)
+        if parent >= 0:
+            if self.amaf_row[parent] == -1:
+                self.amaf_row[parent] = self.new_row()
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+            self.num_children[parent] += 1
+        return node
+
+    def coords(self, move: int) -> Tuple[int, int]:
+        """Board coordinates of a cell id."""
+        return divmod(int(move), self.dim)
+
+    def get_untried_moves(self, node: int, state: ConnectivityTracker) -> List[Tuple[int, int]]:
+        """Moves of the node that have no child node yet, ordered by `move_priors` from worst to best,
+        built on first use from its replayed state."""
+        if self.untried[node] is None:
+            cells, priors = move_priors(state, 3 - int(self.player[node]))
+            coords = state.geometry.coords
+            self.untried[node] = [coords[cell] for cell in cells[np.argsort(priors, kind='stable')].tolist()]
+        return self.untried[node]
+
+    def get_children(self, node: int) -> np.array:
+        """Ids of the children of a node, cached until the node gets a new child."""
+        children = self.children[node]
+        if children is not None and len(children) == self.num_children[node]:
+            return children
+        children = []
+        child = self.first_child[node]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        children = self.children[node] = np.array(children, dtype=np.int32)
+        return children
+
+    def is_fully_expanded(self, node: int, state: ConnectivityTracker) -> bool:
+        """Checks if the node can get no new child for now: all its moves have been expanded,
+        or with progressive widening, it has as many children as its visits allow."""
+        if self.widening and self.num_children[node] >= widening_limit(self.visits[node]):
+            return True
+        return len(self.get_untried_moves(node, state)) == 0
+
+    def best_child(self, node: int, c=1.41, beta_func=None) -> int:
+        """Select the child node with the highest combined UCT-RAVE score, scoring all children at once."""
+        children = self.get_children(node)
+        parent_visits, _ = self.statistics(node)
+        visits, value = self.statistics(children)
+        rave_visits, rave_value = self.rave_statistics(node, children)
+        score = uct_rave_scores(parent_visits, visits, value, rave_visits, rave_value, c, beta_func)
+        return int(children[np.argmax(score)])
+
+    def statistics(self, nodes: Union[int, np.array]) -> Tuple[np.array, np.array]:
+        """Visits and value of the nodes, shared with their transpositions while their position is in the table."""
+        visits, value = self.visits[nodes], self.value[nodes]
+        if self.table is None:
+            return visits, value
+        slots = self.slot[nodes]
+        shared = self.table.keys[slots] == self.key[nodes]
+        return np.where(shared, self.table.visits[slots], visits), np.where(shared, self.table.value[slots], value)
+
+    def rave_statistics(self, node: int, children: np.array) -> Tuple[np.array, np.array]:
+        """AMAF visits and value of the moves of `children`, from the row of their parent `node`."""
+        row = self.amaf_row[node]
+        if row == -1:
+            return np.zeros(len(children)), np.zeros(len(children))
+        moves = self.move[children]
+        return self.amaf_visits[row, moves].astype(np.float64), self.amaf_value[row, moves].astype(np.float64)
+
+    def root_statistics(self) -> np.array:
+        """Move, visits, value, RAVE visits and RAVE value of the children of the root, one row each."""
+        children = self.get_children(0)
+        rave_visits, rave_value = self.rave_statistics(0, children)
+        return np.stack([self.move[children], self.visits[children], self.value[children],
+                         rave_visits, rave_value], axis=1)
+
+    def expand(self, node: int, state: ConnectivityTracker) -> int:
+        """Expand a node by creating one of its child nodes, playing its move on `state`."""
+        move = self.get_untried_moves(node, state).pop()
+        player = 3 - int(self.player[node])
+        state.play(move, player)
+        if self.stats is None:
+            win = state.check_win(move, player)[0]
+        else:
+            win = self.stats.time('check_win', state.check_win, move, player)[0]
+        return self.add_node(node, move[0] * self.dim + move[1], player, win, state.hash)
+
+    def path(self, node: int) -> List[int]:
+        """Ids of the nodes from the root to `node`."""
+        path = []
+        while node != -1:
+            path.append(node)
+            node = self.parent[node]
+        return path[::-1]
+
+    def find_child(self, node: int, move: int) -> int:
+        """Id of the child of a node reached by the cell `move`, -1 if it has not been expanded."""
+        child = self.first_child[node]
+        while child != -1 and self.move[child] != move:
+            child = self.next_sibling[child]
+        return child
+
+    def reroot(self, node: int, state: np.array) -> None:
+        """Makes `node` the root, whose state is `state`, and compacts its subtree at the front of the arrays."""
+        keep = [node]
+        for kept in keep:
+            child = self.first_child[kept]
+            while child != -1:
+                keep.append(child)
+                child = self.next_sibling[child]
+        keep = np.array(keep, dtype=np.int32)
+        remap = np.full(self.size, -1, dtype=np.int32)
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+
+        for name, _ in self.ARRAYS:
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        for name in ('parent', 'first_child', 'next_sibling'):
+            array = getattr(self, name)[:len(keep)]
+            array[:] = np.where(array >= 0, remap[array], -1)
+        self.parent[0] = -1
+        self.next_sibling[0] = -1
+        self.move[0] = -1
+        self.untried = [self.untried[kept] for kept in keep]
+        self.children = [None if self.children[kept] is None else remap[self.children[kept]] for kept in keep]
+        self.size = len(keep)
+
+        # Compact the AMAF rows of the kept nodes in the same way
+        rows = self.amaf_row[:self.size]
+        used = np.flatnonzero(rows >= 0)
+        self.amaf_visits[:len(used)] = self.amaf_visits[rows[used]]
+        self.amaf_value[:len(used)] = self.amaf_value[rows[used]]
+        rows[used] = np.arange(len(used))
+        self.rows = len(used)
+
+        self.state = state.copy()
+        self.tracker = ConnectivityTracker(state)
+
+    def replay(self, node: int) -> ConnectivityTracker:
+        """Reconstructs the state of a node by replaying its moves from the root."""
+        state = self.tracker.copy()
+        for step in self.path(node)[1:]:
+            state.play(self.coords(self.move[step]), int(self.player[step]))
+        return state
+
+def reuse_tree(tree: Tree, state: np.array, player_number: int, table: TranspositionTable = None) -> Tree:
+    """Keeps the subtree of `tree` matching `state`, found by diffing the boards, or starts a new tree using `table`."""
+    if tree is not None and tree.state.shape == state.shape:
+        changed = np.argwhere(tree.state != state)
+        if len(changed) == 2 and (tree.state[tuple(changed.T)] == 0).all():
+            played = {int(state[i, j]): i * tree.dim + j for i, j in changed}
+            if set(played) == {1, 2}:
+                # Our move, then the opponent's reply
+                child = tree.find_child(0, played[player_number])
+                grandchild = tree.find_child(child, played[3 - player_number]) if child != -1 else -1
+                if grandchild != -1 and not tree.terminal[grandchild]:
+                    tree.reroot(grandchild, state)
+                    return tree
+    return Tree(state, player_number, table=table)
+
+def beta_func(visits: np.array, k=500) -> np.array:
+    """RAVE weight function based on the number of visits to the child nodes."""
+    return k / (k + visits)
+
+def uct_rave_scores(parent_visits: float, visits: np.array, value: np.array, rave_visits: np.array, rave_value: np.array, c=1.41, beta_func=None) -> np.array:
+    """Combined UCT-RAVE score of every child, infinite for unvisited children."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # UCT value (exploitation + exploration)
+        uct_value = value / visits + c * np.sqrt(math.log(max(parent_visits, 1)) / visits)
+        # RAVE value
+        rave_value = np.where(rave_visits > 0, rave_value / rave_visits, 0)
+        # Weight the combination of UCT and RAVE values
+        beta = beta_func(visits) if beta_func else rave_visits / (visits + rave_visits + 1)
+        return np.where(visits > 0, (1 - beta) * uct_value + beta * rave_value, np.inf)
+
+# Progressive widening: number of children a node may have after `visits` visits
+WIDEN_BASE = 2
+WIDEN_SCALE = 1.0
+
+def widening_limit(visits: float) -> float:
+    """Number of children allowed to a node with `visits` visits, growing with their square root."""
+    return WIDEN_BASE + WIDEN_SCALE * math.sqrt(visits)
+
+# Weights of the move prior
+OWN_CONTACT = 1.0       # per adjacent stone of the player
+OPPONENT_CONTACT = 0.75 # per adjacent stone of the opponent
+CORNER_PRIOR = 0.5
+EDGE_PRIOR = 0.25
+JOIN_PRIOR = 2.0        # joins two groups of the player, e.g. answers an intrusion into a bridge
+CUT_PRIOR = 1.5         # lies between two groups of the opponent
+PRIOR_NOISE = 0.1       # random tie-break between equal priors
+
+@lru_cache(maxsize=None)
+def prior_tables(dim: int) -> Tuple[np.array, np.array, np.array]:
+    """Flat indices of the cells of the hexagon, their neighbours, and their corner/edge prior."""
+    geometry = get_geometry(dim)
+    hexagon = np.flatnonzero(geometry.on_board)
+    corner = np.array(geometry.corner)[hexagon] != -1
+    edge = np.array(geometry.edge)[hexagon] != -1
+    return hexagon, geometry.neighbour_table[hexagon], CORNER_PRIOR * corner + EDGE_PRIOR * edge
+
+def move_priors(state: ConnectivityTracker, player_num: int) -> Tuple[np.array, np.array]:
+    """Flat indices of the empty cells and a cheap prior of playing them for `player_num`: contact with
+    stones of either player, corners and edges next to stones of the player, and joining own groups or
+    separating the opponent's."""
+    cells = np.array(state.cells)
+    hexagon, neighbours, static = prior_tables(state.dim)
+    empty = cells[hexagon] == 0
+    candidates = hexagon[empty]
+    neighbours = neighbours[empty]
+    around = cells[neighbours]
+    own = (around == player_num).sum(axis=1)
+    opponent = (around == 3 - player_num).sum(axis=1)
+    # A corner or edge only helps a group reaching it: alone, on an empty or sparse board, it is a weak move
+    priors = (own > 0) * static[empty] + OWN_CONTACT * own + OPPONENT_CONTACT * opponent
+    priors += PRIOR_NOISE * np.random.random(len(candidates))
+
+    # Cells touching two stones of one player may join two of its groups
+    for player, count, bonus in ((player_num, own, JOIN_PRIOR), (3 - player_num, opponent, CUT_PRIOR)):
+        groups = state.groups[player]
+        for index in np.flatnonzero(count >= 2).tolist():
+            roots = {groups.find(cell) for cell in neighbours[index].tolist() if state.cells[cell] == player}
+            if len(roots) >= 2:
+                priors[index] += bonus
+    return candidates, priors
+
+def immediate_move(state: np.array, player_number: int) -> Union[Tuple[int, int], None]:
+    """One-step win or block move, if any."""
     opponent = 3 - player_number
-    valid_moves = get_valid_actions(state)
-    
+    winning_moves = get_winning_moves(state)
+
     # Step 1: Check for an immediate winning move
-    for move in valid_moves:
-        new_state = state.copy()
-        new_state[move] = player_number
-        if check_win(new_state, move, player_number)[0]:
-            return move
+    for move in winning_moves[player_number]:
+        return move
 
     # Step 2: Check if the opponent is one step away from winning and block
-    for move in valid_moves:
-        new_state = state.copy()
-        new_state[move] = opponent
-        if check_win(new_state, move, opponent)[0]:
-            return move  # Block the opponent's winning move
+    for move in winning_moves[opponent]:
+        return move  # Block the opponent's winning move
+    return None
+
+def mcts(state: np.array, timer_per_move: float, player_number: int, target_depth=3, num_rollouts=10, tree: Tree = None, time_manager: TimeManager = None,
+         stats: SearchStats = None, iterations: int = None, batched: bool = False, check_immediate: bool = True) -> Tuple[int, int]:
+    """Monte Carlo Tree Search with RAVE, stopped after `iterations` iterations if given, preceded by one-step win and block moves
+    unless `check_immediate` is false (the caller already looked for them)."""
+    if check_immediate:
+        move = immediate_move(state, player_number)
+        if move is not None:
+            return move
 
     # Step 3: MCTS loop
-    root = Node(state=state)
+    if tree is None:
+        tree = Tree(state, player_number)
+    search(tree, timer_per_move, target_depth, num_rollouts, iterations=iterations, time_manager=time_manager, stats=stats, batched=batched)
+    return tree.coords(tree.move[tree.best_child(0, c=0.9, beta_func=beta_func)])
+
+def search(tree: Tree, timer_per_move: float, target_depth=3, num_rollouts=10, iterations: int = None, time_manager: TimeManager = None,
+           stop: Callable[[], bool] = None, start: int = 0, stats: SearchStats = None, batched: bool = False) -> None:
+    """Grows the subtree of the node `start` until the time budget, the target depth or `iterations` iterations
+    of this call are reached, until the time manager stops it early, or until `stop()`, checked every iteration, is true.
+    With `stats`, the iterations are counted and their phases timed. With `batched`, the rollouts of a leaf
+    are simulated together by `batch_playout`."""
     start_time = time.time()
     max_depth_reached = False
+    done = 0
 
     while time.time() - start_time < timer_per_move and not max_depth_reached:
-        leaf_node, depth = tree_policy(root, player_number)
-        if leaf_node is None:
+        if iterations is not None and done >= iterations:
+            break
+        if stop is not None and stop():
+            break
+        if time_manager is not None and done % 8 == 0 and done > 0:
+            children = tree.get_children(0)
+            if time_manager.should_stop(done, tree.visits[children], tree.value[children]):
+                break
+        if stats is None:
+            leaf_node, depth, leaf_state = tree_policy(tree, start=start)
+            backpropagate(tree, leaf_node, *rollout(tree, leaf_node, leaf_state, num_rollouts, batched))
+        else:
+            tree.stats = stats
+            leaf_node, depth, leaf_state = stats.time('tree_policy', tree_policy, tree, start=start)
+            result = stats.time('rollout', rollout, tree, leaf_node, leaf_state, num_rollouts, batched)
+            stats.time('backpropagate', backpropagate, tree, leaf_node, *result)
+            stats.iteration(depth, result[2])
+            tree.stats = None
+        done += 1
+
+        if depth >= target_depth:
+            max_depth_reached = True
+
+def tree_policy(tree: Tree, current_depth=0, max_depth=3, start: int = 0) -> Tuple[int, int, ConnectivityTracker]:
+    """Select a leaf node below `start` for exploration using UCB1, replaying its moves, and track depth."""
+    node = start
+    state = tree.replay(start) if start else tree.tracker.copy()
+    while not tree.terminal[node] and current_depth < max_depth:
+        if not tree.is_fully_expanded(node, state):
+            return tree.expand(node, state), current_depth + 1, state
+        if len(tree.get_children(node)) == 0:
+            break   # Board full
+        node = tree.best_child(node, c=0.9, beta_func=beta_func)
+        state.play(tree.coords(tree.move[node]), int(tree.player[node]))
+        current_depth += 1
+    return node, current_depth, state
+
+NEVER = np.iinfo(np.int16).max  # Time of the cells that are never taken
+
+@lru_cache(maxsize=None)
+def hexagon_tables(dim: int) -> Tuple[np.array, np.array, np.array]:
+    """Flat indices of the cells of the hexagon, their neighbours as positions in that list (the
+    position after the last cell standing for the outside), and the corner/edge sources of each cell."""
+    geometry = get_geometry(dim)
+    hexagon = np.flatnonzero(geometry.on_board)
+    position = np.full(geometry.area, len(hexagon), dtype=np.int32)
+    position[hexagon] = np.arange(len(hexagon))
+    table = np.array([[position[cell + offset] for offset in geometry.steps[cell]] for cell in hexagon], dtype=np.int32)
+    sources = np.zeros((12, len(hexagon) + 1), dtype=bool)
+    for index, cell in enumerate(hexagon):
+        if geometry.corner[cell] != -1:
+            sources[geometry.corner[cell], index] = True
+        if geometry.edge[cell] != -1:
+            sources[6 + geometry.edge[cell], index] = True
+    return hexagon, table, sources
+
+def batch_playout(state: ConnectivityTracker, player_num: int, count: int, rng=np.random, orders: np.array = None) -> Tuple[np.array, np.array]:
+    """Plays `count` random games at once from the state, with `player_num` to move. Returns the winners (0 for a draw) and game lengths.
+
+    The empty cells are filled in a random order, so every cell gets the time at which it is taken.
+    For each player, the time at which a structure first exists is found by label propagation over
+    the cells of the hexagon, for all the games together:
+    - bridges and forks: bottleneck time from each corner and edge (min over paths of the max time on
+      the path), a cell joining 2 corners or 3 edges completes the structure at the 2nd or 3rd smallest;
+    - rings: widest escape time to the outside of the hexagon (max over paths of the min time at which
+      a stone of the player closes the path), a cell is enclosed once all its neighbours' routes are closed.
+    """
+    hexagon, table, sources = hexagon_tables(state.dim)
+    size = len(hexagon)
+    cells = np.array(state.cells)[hexagon]
+    empty = np.flatnonzero(cells == 0)
+    if orders is None:
+        orders = rng.random((count, len(empty))).argsort(axis=1)
+    rows = np.arange(count)[:, None]
+
+    # Time at which each cell is taken (0 for the stones already on the board) and by whom, the last column being the outside
+    times = np.full((count, size + 1), NEVER, dtype=np.int16)
+    times[:, :size] = np.where((cells == 1) | (cells == 2), 0, NEVER)
+    owner = np.zeros((count, size + 1), dtype=np.int8)
+    owner[:, :size] = cells
+    moves = empty[orders]
+    times[rows, moves] = np.arange(1, len(empty) + 1, dtype=np.int16)
+    owner[rows, moves] = np.where(np.arange(len(empty)) % 2 == 0, player_num, 3 - player_num)
+    # (count, 2, cells): time of the stones of each player
+    player_times = np.stack([np.where(owner == 1, times, NEVER), np.where(owner == 2, times, NEVER)], axis=1).astype(np.int16)
+
+    # Bridges and forks: bottleneck times from the 6 corners and the 6 edges
+    stone_times = player_times[:, :, None, :]
+    reach = np.where(sources, stone_times, NEVER).astype(np.int16)
+    while True:
+        spread = np.minimum(reach[..., :size], np.maximum(stone_times[..., :size], reach[..., table].min(axis=-1)))
+        if np.array_equal(spread, reach[..., :size]):
+            break
+        reach[..., :size] = spread
+    bridge = np.partition(reach[:, :, :6, :size], 1, axis=2)[:, :, 1].min(axis=-1)
+    fork = np.partition(reach[:, :, 6:, :size], 2, axis=2)[:, :, 2].min(axis=-1)
+
+    # Rings: escape times to the outside, through the cells not yet taken by the player
+    escape = np.full((count, 2, size + 1), -1, dtype=np.int16)
+    escape[..., size] = NEVER
+    while True:
+        spread = np.minimum(player_times[..., :size], escape[..., table].max(axis=-1))
+        if np.array_equal(spread, escape[..., :size]):
+            break
+        escape[..., :size] = spread
+    ring = escape[..., table].max(axis=-1).min(axis=-1)
+
+    # The first player to complete a structure wins
+    finish = np.minimum(np.minimum(bridge, fork), ring)
+    lengths = finish.min(axis=1)
+    winners = np.where(lengths == NEVER, 0, finish.argmin(axis=1) + 1)
+    return winners, np.where(lengths == NEVER, len(empty), lengths)
+
+@lru_cache(maxsize=None)
+def cell_ids(dim: int) -> np.array:
+    """Cell id (i * dim + j) of every flat index of the padded board, -1 for the padding."""
+    geometry = get_geometry(dim)
+    ids = np.full(geometry.area, -1, dtype=np.int32)
+    ids[list(geometry.cells)] = np.arange(dim * dim)
+    return ids
+
+def rollout(tree: Tree, node: int, state: ConnectivityTracker, num_rollouts: int = 10, batched: bool = False) -> Tuple[float, np.array, int]:
+    """Simulate multiple random games from the node's state and return the average outcome for the root player.
+    With `batched`, the games are simulated together by `batch_playout` instead of one by one.
+
+    Also returns the AMAF statistics of the games, as a (2, 2, cells) array: for each player, how many times
+    they played every cell and the sum of the outcomes of those games; and the number of games."""
+    player_number = tree.player_number
+    amaf = np.zeros((2, 2, tree.dim * tree.dim))
+    if tree.terminal[node]:
+        return (1.0 if tree.player[node] == player_number else 0.0), amaf, 1
+
+    current_player = 3 - int(tree.player[node])
+    empty = np.array([cell for cell in state.geometry.cells if state.cells[cell] == 0], dtype=np.int32)
+    if batched:
+        hexagon, _, _ = hexagon_tables(tree.dim)
+        orders = np.random.random((num_rollouts, len(empty))).argsort(axis=1)
+        winners, lengths = batch_playout(state, current_player, num_rollouts, orders=orders)
+        moves = empty[orders]
+    else:
+        moves = np.empty((num_rollouts, len(empty)), dtype=np.int32)
+        winners = np.empty(num_rollouts, dtype=np.int32)
+        lengths = np.empty(num_rollouts, dtype=np.int32)
+        for game in range(num_rollouts):
+            order = empty.tolist()
+            random.shuffle(order)
+            winners[game], lengths[game] = state.playout(current_player, order=order)
+            moves[game] = order
+    # Player won 1, draw 0.5, opponent won 0
+    outcomes = np.where(winners == player_number, 1, np.where(winners == 0, 0.5, 0))
+
+    if tree.full_amaf and len(empty):
+        ids = cell_ids(tree.dim)[moves]
+        steps = np.arange(len(empty))
+        played = steps < lengths[:, None]
+        first = steps % 2 == 0
+        for player, turns in ((current_player, first), (3 - current_player, ~first)):
+            mask = played & turns
+            np.add.at(amaf[player - 1, 0], ids[mask], 1)
+            np.add.at(amaf[player - 1, 1], ids[mask], np.broadcast_to(outcomes[:, None], mask.shape)[mask])
+    return float(outcomes.mean()), amaf, num_rollouts
+
+
+def backpropagate(tree: Tree, node: int, outcome: float, amaf: np.array = None, games: int = 1) -> None:
+    """Propagate the result of the simulation back up the tree, from the point of view of each node's player."""
+    path = np.array(tree.path(node), dtype=np.int32)
+    outcomes = np.where(tree.player[path] == tree.player_number, outcome, 1 - outcome)
+    if tree.table is not None:
+        update_table(tree, path, outcomes)
+    tree.visits[path] += 1
+    tree.value[path] += outcomes
+    update_amaf(tree, path, outcome, amaf, games)
+
+def update_table(tree: Tree, path: np.array, outcomes: np.array) -> None:
+    """Adds the outcomes to the table entries of the path. A position evicted since its node was
+    created is put back with the statistics of the node, before they are updated."""
+    table = tree.table
+    for node, outcome in zip(path.tolist(), outcomes.tolist()):
+        key = int(tree.key[node])
+        slot = int(tree.slot[node])
+        if int(table.keys[slot]) == key:
+            table.touch(key)
+        else:
+            slot = tree.slot[node] = table.lookup(key, tree.visits[node], tree.value[node])
+        table.visits[slot] += 1
+        table.value[slot] += outcome
+
+def update_amaf(tree: Tree, path: np.array, outcome: float, amaf: np.array = None, games: int = 1) -> None:
+    """Adds to every node of the path the moves played after it by its player to move, in the tree and in the playouts."""
+    played = np.zeros((2, 2, tree.dim * tree.dim)) if amaf is None else amaf.copy()
+    for depth in range(len(path) - 1, -1, -1):
+        if depth + 1 < len(path):
+            # The tree move below the node happened in every playout
+            child = path[depth + 1]
+            played[tree.player[child] - 1, :, tree.move[child]] += (games, outcome * games)
+        row = tree.amaf_row[path[depth]]
+        if row == -1:
             continue
+        player = 3 - tree.player[path[depth]]
+        counts, wins = played[player - 1]
+        tree.amaf_visits[row] += counts
+        tree.amaf_value[row] += wins if player == tree.player_number else counts - wins
 
-        outcome = rollout(leaf_node, player_number, num_rollouts)
-        backpropagate(leaf_node, outcome)
+def search_worker(conn, pool_conn, player_number: int, seed: int) -> None:
+    """Worker process of `SearchPool`, keeping its own tree between moves."""
+    # Drop the inherited pool end of the pipe, so that the worker sees EOF if the pool process dies
+    pool_conn.close()
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    tree = None
+    table = TranspositionTable()
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        state, timer_per_move, target_depth, num_rollouts, batched = request
+        tree = reuse_tree(tree, state, player_number, table)
+        search(tree, timer_per_move, target_depth, num_rollouts, batched=batched)
+        conn.send(tree.root_statistics())
 
-        # Update RAVE statistics
-        node = leaf_node
-        while node.parent:
-            node.parent.update_rave(node.move, outcome)
-            node = node.parent
+class SearchPool:
+    """Persistent worker processes searching the same root independently (root parallelisation)."""
 
-        if depth >= target_depth:
-            max_depth_reached = True
+    def __init__(self, player_number: int, workers: int):
+        seed = random.randrange(2**31)
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            conn, worker_conn = mp.Pipe()
+            process = mp.Process(target=search_worker, args=(worker_conn, conn, player_number, seed + worker), daemon=True)
+            process.start()
+            worker_conn.close()
+            self.connections.append(conn)
+            self.processes.append(process)
+        self.iterations = 0
 
-    return root.best_child(c=0.9, beta_func=beta_func).move
+    def search(self, state: np.array, timer_per_move: float, target_depth=3, num_rollouts=10, batched: bool = False) -> Tuple[int, int]:
+        """Runs all the workers for the time budget, and picks a move from their merged root statistics."""
+        for conn in self.connections:
+            conn.send((state, timer_per_move, target_depth, num_rollouts, batched))
+        statistics = np.concatenate([conn.recv() for conn in self.connections])
+        self.iterations = int(statistics[:, 1].sum())
+        if len(statistics) == 0:
+            return random.choice(get_valid_actions(state))
 
-def tree_policy(node: Node, player_number: int, current_depth=0, max_depth=3) -> Tuple[Node, int]:
-    """Select a leaf node for exploration using UCB1 and track depth."""
-    while not node.terminal_node and current_depth < max_depth:
-        if not node.is_fully_expanded():
-            return expand(node, player_number), current_depth + 1
-        node = node.best_child(c=0.9, beta_func=beta_func)
-        current_depth += 1
-    return node, current_depth
-
-def expand(node: Node, player_number: int) -> Node:
-    """Expand a node by creating one of its child nodes."""
-    valid_moves = get_valid_actions(node.state)
-    tried_moves = [child.move for child in node.children]
-
-    for move in valid_moves:
-        if move not in tried_moves:
-            new_state = node.state.copy()
-            new_state[move] = player_number
-            return node.add_child(move, new_state)
-    return None
+        # Sum the statistics of each root child over the workers
+        moves, inverse = np.unique(statistics[:, 0].astype(np.int64), return_inverse=True)
+        merged = np.zeros((len(moves), 4))
+        np.add.at(merged, inverse, statistics[:, 1:])
+        visits, value, rave_visits, rave_value = merged.T
+        score = uct_rave_scores(visits.sum(), visits, value, rave_visits, rave_value, c=0.9, beta_func=beta_func)
+        return divmod(int(moves[np.argmax(score)]), state.shape[0])
 
-def rollout(node: Node, player_number: int, num_rollouts: int = 10) -> float:
-    """Simulate multiple random games from the current node and return the average outcome."""
-    total_outcome = 0.0
-    
-    for _ in range(num_rollouts):
-        current_state = node.state.copy()
-        current_player = player_number
-
-        while True:
-            moves = get_valid_actions(current_state)
-            if not moves:
-                break
-            move = random.choice(moves)
-            current_state[move] = current_player
-
-            if is_terminal(current_state, move):
-                if check_win(current_state, move, player_number)[0]:
-                    total_outcome += 1  # Player won
-                else:
-                    total_outcome += 0  # Opponent won
-                break
-            current_player = 3 - current_player
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
+
+class SharedTree(Tree):
+    """Fixed-capacity tree in shared memory, grown concurrently by the workers of `TreeParallelPool`.
+
+    Expansions are serialised by a lock, statistics are updated without locking. Untried moves are
+    not stored: a node records its number of legal moves, and is expanded with an empty cell that
+    none of its children has taken. The node arrays are views of shared buffers, rebuilt in every
+    process, so that the tree is shared whether the workers are forked or spawned.
+    """
+
+    AMAF_ARRAYS = ('amaf_visits', 'amaf_value')
+
+    ARRAYS = Tree.ARRAYS + (('num_moves', np.int32),)
+
+    def __init__(self, dim: int, capacity: int = 1 << 18, rows: int = None):
+        self.dim = dim
+        self.capacity = capacity
+        self.table = None  # The workers share the tree itself, not a transposition table
+        self.lock = mp.Lock()
+        self.shared_size = mp.RawValue('i', 0)
+        self.buffers = {name: mp.RawArray(np.ctypeslib.as_ctypes_type(dtype), capacity) for name, dtype in self.ARRAYS}
+        # AMAF rows, for the first nodes to get children (the others are scored without RAVE)
+        self.full_amaf = True
+        self.row_capacity = rows or max(capacity // 32, 1)
+        self.shared_rows = mp.RawValue('i', 0)
+        for name in self.AMAF_ARRAYS:
+            self.buffers[name] = mp.RawArray(np.ctypeslib.as_ctypes_type(np.float32), self.row_capacity * dim * dim)
+        self.views()
+        self.children = {}  # Children ids of the fully expanded nodes, cached by each process
+
+    def views(self) -> None:
+        """Creates the NumPy views of the shared buffers in this process."""
+        for name, dtype in self.ARRAYS:
+            setattr(self, name, np.frombuffer(self.buffers[name], dtype=dtype))
+        for name in self.AMAF_ARRAYS:
+            setattr(self, name, np.frombuffer(self.buffers[name], dtype=np.float32).reshape(self.row_capacity, self.dim * self.dim))
+
+    def __getstate__(self) -> dict:
+        """State sent to a spawned worker: the shared buffers, lock and counters, but not the views,
+        which would be pickled as private copies."""
+        views = {name for name, _ in self.ARRAYS} | set(self.AMAF_ARRAYS)
+        state = {name: value for name, value in self.__dict__.items() if name not in views}
+        state['children'] = {}
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.views()
+
+    @property
+    def size(self) -> int:
+        return self.shared_size.value
+
+    def new_row(self) -> int:
+        """Allocates a zeroed row of AMAF statistics, -1 if there is none left. Must hold the lock."""
+        row = self.shared_rows.value
+        if row == self.row_capacity:
+            return -1
+        self.amaf_visits[row] = self.amaf_value[row] = 0
+        self.shared_rows.value = row + 1
+        return row
+
+    def reset(self, state: np.array, player_number: int) -> None:
+        """Empties the tree and sets its root. Called by the pool while the workers are idle."""
+        self.shared_size.value = 0
+        self.shared_rows.value = 0
+        self.attach(state, player_number)
+        self.add_node(-1, -1, 3 - player_number, num_moves=int((state == 0).sum()))
 
-        total_outcome += 0.5  # Draw case
+    def attach(self, state: np.array, player_number: int) -> None:
+        """Sets the root state of this process' view of the tree."""
+        self.state = state.copy()
+        self.player_number = player_number
+        self.tracker = ConnectivityTracker(state)
+        self.children = {}
+
+    def add_node(self, parent: int, move: int, player: int, terminal: bool = False, num_moves: int = 0) -> int:
+        """Appends a node, returns its id or -1 if the tree is full. Must hold the lock, except for the root."""
+        node = self.shared_size.value
+        if node == self.capacity:
+            return -1
+        self.visits[node] = self.value[node] = 0
+        self.parent[node] = parent
+        self.first_child[node] = -1
+        self.next_sibling[node] = -1
+        self.move[node] = move
+        self.player[node] = player
+        self.terminal[node] = terminal
+        self.amaf_row[node] = -1
+        self.num_moves[node] = 0 if terminal else num_moves
+        self.num_children[node] = 0
+        if parent >= 0:
+            if self.amaf_row[parent] == -1:
+                self.amaf_row[parent] = self.new_row()
+            self.next_sibling[node] = self.first_child[parent]
+            self.first_child[parent] = node
+            self.num_children[parent] += 1
+        self.shared_size.value = node + 1
+        return node
+
+    def get_children(self, node: int) -> np.array:
+        """Ids of the children of a node, cached once the node is fully expanded."""
+        if node in self.children:
+            return self.children[node]
+        children = []
+        child = self.first_child[node]
+        while child != -1:
+            children.append(child)
+            child = self.next_sibling[child]
+        children = np.array(children, dtype=np.int32)
+        if len(children) == self.num_moves[node]:
+            self.children[node] = children
+        return children
+
+    def is_fully_expanded(self, node: int, state: ConnectivityTracker = None) -> bool:
+        return self.num_children[node] >= self.num_moves[node]
+
+    def expand(self, node: int, state: ConnectivityTracker) -> int:
+        """Expand a node with a random untried move, playing it on `state`. Returns -1 if another worker
+        expanded the last move of the node first, or if the tree is full."""
+        with self.lock:
+            if self.is_fully_expanded(node):
+                return -1
+            empty = np.flatnonzero(state.board == 0)
+            taken = self.move[self.get_children(node)]
+            untried = empty[~np.isin(empty, taken)]
+            move = self.coords(untried[random.randrange(len(untried))])
+            player = 3 - int(self.player[node])
+            state.play(move, player)
+            win = state.check_win(move, player)[0]
+            return self.add_node(node, move[0] * self.dim + move[1], player, win, len(empty) - 1)
+
+VIRTUAL_LOSS = 1
+
+def shared_tree_policy(tree: SharedTree, max_depth=3) -> Tuple[int, ConnectivityTracker]:
+    """Descends the shared tree like `tree_policy`, adding a virtual loss to every node on the way so
+    that concurrent workers spread over different branches. Returns -1 if the tree is full."""
+    node = 0
+    state = tree.tracker.copy()
+    tree.visits[node] += VIRTUAL_LOSS
+    depth = 0
+    while not tree.terminal[node] and depth < max_depth:
+        if not tree.is_fully_expanded(node):
+            child = tree.expand(node, state)
+            if child != -1:
+                tree.visits[child] += VIRTUAL_LOSS
+                return child, state
+            if tree.size == tree.capacity:
+                backpropagate_shared(tree, node, None)
+                return -1, state
+            continue
+        if tree.num_moves[node] == 0:
+            break   # Board full
+        node = tree.best_child(node, c=0.9, beta_func=beta_func)
+        tree.visits[node] += VIRTUAL_LOSS
+        state.play(tree.coords(tree.move[node]), int(tree.player[node]))
+        depth += 1
+    return node, state
+
+def backpropagate_shared(tree: SharedTree, node: int, outcome: Union[float, None], amaf: np.array = None, games: int = 1) -> None:
+    """Replaces the virtual losses on the path to `node` by the outcome of the simulation (none to only revert them)."""
+    path = np.array(tree.path(node), dtype=np.int32)
+    tree.visits[path] += 1 - VIRTUAL_LOSS if outcome is not None else -VIRTUAL_LOSS
+    if outcome is None:
+        return
+    tree.value[path] += np.where(tree.player[path] == tree.player_number, outcome, 1 - outcome)
+    update_amaf(tree, path, outcome, amaf, games)
 
-    # Return the average outcome
-    return total_outcome / num_rollouts
+def shared_search_worker(conn, pool_conn, tree: SharedTree, player_number: int, seed: int) -> None:
+    """Worker process of `TreeParallelPool`."""
+    pool_conn.close()
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        state, deadline, num_rollouts, batched = request
+        tree.attach(state, player_number)
+        iterations = 0
+        while time.time() < deadline:
+            leaf_node, leaf_state = shared_tree_policy(tree)
+            if leaf_node == -1:
+                break
+            backpropagate_shared(tree, leaf_node, *rollout(tree, leaf_node, leaf_state, num_rollouts, batched))
+            iterations += 1
+        conn.send(iterations)
 
+class TreeParallelPool:
+    """Persistent worker processes growing one tree in shared memory (tree parallelisation)."""
 
-def backpropagate(node: Node, outcome: float) -> None:
-    """Propagate the result of the simulation back up the tree."""
-    while node is not None:
-        node.visits += 1
-        node.value += outcome
-        node = node.parent
-        outcome = 1 - outcome
+    def __init__(self, player_number: int, workers: int, dim: int, capacity: int = 1 << 18):
+        self.tree = SharedTree(dim, capacity)
+        self.player_number = player_number
+        self.iterations = 0
+        seed = random.randrange(2**31)
+        self.connections = []
+        self.processes = []
+        for worker in range(workers):
+            conn, worker_conn = mp.Pipe()
+            process = mp.Process(target=shared_search_worker, args=(worker_conn, conn, self.tree, player_number, seed + worker), daemon=True)
+            process.start()
+            worker_conn.close()
+            self.connections.append(conn)
+            self.processes.append(process)
 
-def is_terminal(state: np.array, move: Tuple[int, int]) -> bool:
-    """Check if the current state is terminal (win or draw)."""
-    return check_win(state, move, 1)[0] or check_win(state, move, 2)[0]
+    def search(self, state: np.array, timer_per_move: float, target_depth=3, num_rollouts=10, batched: bool = False) -> Tuple[int, int]:
+        """Runs all the workers on a fresh shared tree for the time budget, and picks the best root child."""
+        tree = self.tree
+        tree.reset(state, self.player_number)
+        deadline = time.time() + timer_per_move
+        for conn in self.connections:
+            conn.send((state, deadline, num_rollouts, batched))
+        self.iterations = sum(conn.recv() for conn in self.connections)
+        tree.children = {}
+        if tree.num_children[0] == 0:
+            return random.choice(get_valid_actions(state))
+        return tree.coords(tree.move[tree.best_child(0, c=0.9, beta_func=beta_func)])
+
+    def close(self) -> None:
+        for conn in self.connections:
+            conn.send(None)
+        for process in self.processes:
+            process.join()
 
 class AIPlayer:
 
-    def __init__(self, player_number: int, timer):
+    def __init__(self, player_number: int, timer, workers: int = 1, parallel: str = 'root', table_size: int = 1 << 17,
+                 solver_cells: int = 20, batched: bool = False):
         """
         Intitialize the AIPlayer Agent
 
@@ -177,11 +898,38 @@ class AIPlayer:
         `timer: Timer`
             - a Timer object that can be used to fetch the remaining time for any player
             - Run `fetch_remaining_time(timer, player_number)` to fetch remaining time of a player
+
+        `workers (int)`: Number of search processes, started on the first move and kept for the game
+
+        `parallel (str)`: With several workers, 'root' for independent trees merged at the root,
+            'tree' for one tree shared by all the workers
+
+        `table_size (int)`: Number of positions kept in the transposition table, 0 to search without it
+
+        `solver_cells (int)`: Number of empty cells from which positions are first given to the
+            proof-number solver, for up to half of the move's target time
+
+        `batched (bool)`: Simulate the rollouts of every leaf together with `batch_playout`, one NumPy call
+            per leaf, instead of one fill-and-replay playout at a time
         """
         self.player_number = player_number
         self.type = 'ai'
         self.player_string = 'Player {}: ai'.format(player_number)
         self.timer = timer
+        self.tree = None  # Search tree kept between moves
+        # Statistics of the positions, kept between moves too; `self.table.stats()` gives its hit rate and evictions
+        self.table = TranspositionTable(table_size) if table_size > 0 else None
+        self.solver = ProofNumberSolver(player_number)
+        self.solver_cells = solver_cells
+        self.batched = batched
+        self.stats_writer = None  # Set to a `StatsWriter` to record every search
+        self.search_stats = None
+        self.workers = workers
+        self.parallel = parallel
+        self.pool = None
+        self.time_manager = TimeManager(timer, player_number)
+        self.ponder_node = -1  # Node of the tree after our last move, searched while the opponent thinks
+        self.books = {}  # Opening book of every board dimension met, None if there is no book for it
 
     def get_move(self, state: np.array) -> Tuple[int, int]:
         """
@@ -200,6 +948,88 @@ class AIPlayer:
         Tuple[int, int]: action (coordinates of a board cell)
         """
 
-        per_move_time = fetch_remaining_time(self.timer, 1) / (state.shape[0]*10)
-        move = mcts(state, timer_per_move=per_move_time, player_number=self.player_number, target_depth=2**32-1, num_rollouts=10)
+        self.search_stats = self.stats_writer.start() if self.stats_writer is not None else None
+        move, source = self.choose_move(state)
+        if self.search_stats is not None:
+            self.write_stats(move, source)
         return (int(move[0]), int(move[1]))
+
+    def choose_move(self, state: np.array) -> Tuple[Tuple[int, int], str]:
+        """Move to play and where it comes from: 'book', 'solver', 'immediate', 'pool' or 'search'."""
+        per_move_time = self.time_manager.start(state)
+        self.ponder_node = -1
+        # A one-step win or block comes first, the book being built by searches that may miss them
+        move = immediate_move(state, self.player_number)
+        if move is not None:
+            return move, 'immediate'
+        if state.shape[0] not in self.books:
+            self.books[state.shape[0]] = load_book(state.shape[0])
+        book = self.books[state.shape[0]]
+        move = book.lookup(state) if book is not None else None
+        if move is not None:
+            return move, 'book'
+
+        # Late positions are solved exactly if possible. A proven win or loss makes the search pointless,
+        # a draw does not: the search still has to find a move that keeps it.
+        if int((state == 0).sum()) <= self.solver_cells:
+            result, move = self.solver.solve(state, seconds=self.time_manager.target / 2)
+            if result == LOSS:
+                move = self.losing_move(state)
+            if result in (WIN, LOSS):
+                return move, 'solver'
+            per_move_time = max(per_move_time - self.time_manager.elapsed(), 0)
+
+        if self.workers > 1:
+            if self.pool is None and self.parallel == 'tree':
+                self.pool = TreeParallelPool(self.player_number, self.workers, state.shape[0])
+            elif self.pool is None:
+                self.pool = SearchPool(self.player_number, self.workers)
+            # The workers cannot be stopped early, they get the target time of the move
+            move = self.pool.search(state, timer_per_move=max(self.time_manager.target - self.time_manager.elapsed(), 0), target_depth=2**32-1, num_rollouts=10,
+                                    batched=self.batched)
+            return move, 'pool'
+
+        self.tree = reuse_tree(self.tree, state, self.player_number, self.table)
+        move = mcts(state, timer_per_move=per_move_time, player_number=self.player_number, target_depth=2**32-1, num_rollouts=10, tree=self.tree,
+                    time_manager=self.time_manager, stats=self.search_stats, batched=self.batched, check_immediate=False)
+        self.ponder_node = int(self.tree.find_child(0, move[0] * self.tree.dim + move[1]))
+        return move, 'search'
+
+    def write_stats(self, move: Tuple[int, int], source: str) -> None:
+        """Streams the statistics of the move just chosen, with the size of the tree and the confidence in the move."""
+        fields = {'agent': 'ai', 'player': self.player_number, 'move': [int(move[0]), int(move[1])], 'source': source,
+                  'target': round(self.time_manager.target, 6), 'limit': round(self.time_manager.limit, 6)}
+        if source == 'search':
+            fields['tree_size'] = int(self.tree.size)
+            fields['root_visits'] = float(self.tree.visits[0])
+            if self.ponder_node != -1:
+                visits = float(self.tree.visits[self.ponder_node])
+                fields['move_visits_share'] = round(visits / max(float(self.tree.visits[0]), 1), 4)
+                fields['move_value'] = round(float(self.tree.value[self.ponder_node]) / max(visits, 1), 4)
+            if self.table is not None:
+                fields['table'] = self.table.stats()
+        elif source == 'pool':
+            fields['pool_iterations'] = int(self.pool.iterations)
+        self.stats_writer.write(self.search_stats, **fields)
+
+    def losing_move(self, state: np.array) -> Tuple[int, int]:
+        """Move of a position the opponent is proven to win, with no immediate threat to block (`choose_move` played it):
+        the most visited move of the tree kept from the previous search, else the move with the best prior."""
+        self.tree = reuse_tree(self.tree, state, self.player_number, self.table)
+        children = self.tree.get_children(0)
+        if len(children):
+            return self.tree.coords(self.tree.move[children[np.argmax(self.tree.visits[children])]])
+        cells, priors = move_priors(self.tree.tracker, self.player_number)
+        return get_geometry(self.tree.dim).coords[int(cells[np.argmax(priors)])]
+
+    def ponder(self, stop: Callable[[], bool]) -> None:
+        """
+        Searches the position after our last move until `stop()` is true, so that the next
+        `get_move` reuses the subtree of the opponent's actual reply
+
+        # Parameters
+        `stop (Callable[[], bool])`: Checked after every iteration, true once the next state has arrived
+        """
+        if self.ponder_node == -1 or self.tree.terminal[self.ponder_node]:
+            return
+        search(self.tree, math.inf, target_depth=2**32-1, num_rollouts=10, stop=stop, start=self.ponder_node, batched=self.batched)
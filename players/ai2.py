@@ -1,16 +1,124 @@
+import os
 import time
 import math
 import random
+import struct
 import numpy as np
 from helper import *
-
-from collections import defaultdict
-
-# Global dictionaries for LGR
-last_good_reply = defaultdict(dict)
-# Global dictionaries for N-grams
-ngram_counts = defaultdict(lambda: defaultdict(int))
-ngram_wins = defaultdict(lambda: defaultdict(int))
+from timing import TimeManager
+from instrumentation import SearchStats
+
+POLICY_HEADER = struct.Struct('<4sII')  # Magic, version, board dimension
+POLICY_MAGIC = b'HVPT'
+POLICY_VERSION = 1
+POLICY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'policies')
+
+def policy_path(dim: int) -> str:
+    """Path of the saved tables of the boards of dimension `dim`."""
+    return os.path.join(POLICY_DIR, 'size{}.policy'.format((dim + 1) // 2))
+
+class PolicyTables:
+    """Last-good-reply and 2-gram statistics of the playouts of one board size, as dense arrays indexed by cell id (i * dim + j)."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        cells = dim * dim
+        # Reply of every player (rows 1 and 2) to every cell, -1 if it has none
+        self.reply = np.full((3, cells), -1, dtype=np.int32)
+        # Times a move (column) followed a move (row), and the times the searching player then won.
+        # Floats, as they are scaled down when saved so that older games weigh less.
+        self.counts = np.zeros((cells, cells), dtype=np.float32)
+        self.wins = np.zeros((cells, cells), dtype=np.float32)
+
+    @classmethod
+    def load(cls, path: str) -> 'PolicyTables':
+        """Tables saved by `save`, memory-mapped copy-on-write: pages are read on first use and the changes stay in memory."""
+        with open(path, 'rb') as file:
+            magic, version, dim = POLICY_HEADER.unpack(file.read(POLICY_HEADER.size))
+        if magic != POLICY_MAGIC or version != POLICY_VERSION:
+            raise ValueError('{} is not a policy file of version {}'.format(path, POLICY_VERSION))
+        tables = cls.__new__(cls)
+        tables.dim = dim
+        cells = dim * dim
+        offset = POLICY_HEADER.size
+        for name, dtype, shape in (('reply', np.int32, (3, cells)), ('counts', np.float32, (cells, cells)), ('wins', np.float32, (cells, cells))):
+            setattr(tables, name, np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape))
+            offset += np.dtype(dtype).itemsize * shape[0] * shape[1]
+        return tables
+
+    def save(self, path: str, decay: float = 1.0) -> None:
+        """Writes the tables, with the 2-gram statistics scaled by `decay`, to a new file replacing `path`,
+        so that a game reading the old file keeps a consistent copy. The tables in memory are not scaled."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary, 'wb') as file:
+            file.write(POLICY_HEADER.pack(POLICY_MAGIC, POLICY_VERSION, self.dim))
+            file.write(np.ascontiguousarray(self.reply).tobytes())
+            for table in (self.counts, self.wins):
+                file.write((table * np.float32(decay)).astype(np.float32).tobytes())
+        os.replace(temporary, path)
+
+    def select_move(self, player: int, previous: int, legal: np.array, epsilon: float = 0.1) -> int:
+        """Cell id of the playout move of `player` among the `legal` mask: the last good reply to the `previous` cell
+        if it is legal, else the following move of best 2-gram win rate, or a random move with probability `epsilon`."""
+        if previous >= 0:
+            reply = self.reply[player, previous]
+            if reply >= 0 and legal[reply]:
+                return int(reply)
+        if previous < 0 or random.random() < epsilon:
+            return random_cell(legal)
+        counts = self.counts[previous]
+        if not counts[legal].any():
+            return random_cell(legal)
+        rates = np.divide(self.wins[previous], counts, out=np.zeros(len(counts), dtype=np.float32), where=counts > 0)
+        rates[~legal] = -1
+        return int(np.argmax(rates))
+
+    def update(self, sequence: List[int], outcome: float, player_number: int) -> None:
+        """Update the Last-Good-Reply and 2-gram tables with the cells played in a playout started by `player_number`."""
+        if len(sequence) < 2:
+            return
+        sequence = np.array(sequence, dtype=np.int32)
+        previous, replies = sequence[:-1], sequence[1:]
+        winner = player_number if outcome == 1 else 3 - player_number if outcome == 0 else None
+
+        if winner is not None:
+            # Player of every reply; the first move of the sequence is played by `player_number`
+            players = np.where(np.arange(1, len(sequence)) % 2 == 0, player_number, 3 - player_number)
+            won = players == winner
+            self.reply[players[won], previous[won]] = replies[won]
+            # LGRF-1: the loser forgets its reply. Every cell is played once, so the pairs are distinct.
+            self.reply[players[~won], previous[~won]] = -1
+
+        self.counts[previous, replies] += 1
+        if winner == player_number:
+            self.wins[previous, replies] += 1
+
+# Tables of every board size, kept for the whole game
+policy_tables = {}
+
+def get_policy_tables(dim: int) -> PolicyTables:
+    """Tables of the boards of dimension `dim`, created on first use."""
+    if dim not in policy_tables:
+        policy_tables[dim] = PolicyTables(dim)
+    return policy_tables[dim]
+
+def load_policy_tables(dim: int) -> bool:
+    """Starts the tables of the boards of dimension `dim` from their saved file, unless they are in use already.
+    Returns whether the saved tables were loaded."""
+    path = policy_path(dim)
+    if dim in policy_tables or not os.path.exists(path):
+        return False
+    tables = PolicyTables.load(path)
+    if tables.dim != dim:
+        return False
+    policy_tables[dim] = tables
+    return True
+
+def random_cell(legal: np.array) -> int:
+    """Cell id chosen uniformly at random among the `legal` mask."""
+    cells = np.flatnonzero(legal)
+    return int(cells[random.randrange(len(cells))])
 
 class Node:
     def __init__(self, state, parent=None, move=None):
@@ -23,11 +131,18 @@ class Node:
         self.terminal_node = False
         self.rave_visits = {}
         self.rave_value = {}
+        self.untried_moves = None
         self.last_good_reply = {}
 
+    def get_untried_moves(self) -> MoveSet:
+        """Moves of the current state that have no child node yet, built on first use."""
+        if self.untried_moves is None:
+            self.untried_moves = MoveSet.from_board(self.state)
+        return self.untried_moves
+
     def is_fully_expanded(self) -> bool:
         """Checks if all possible actions from the current state have been expanded."""
-        return len(self.children) == len(get_valid_actions(self.state))
+        return len(self.get_untried_moves()) == 0
 
     def best_child(self, c=1.41, beta_func=None) -> 'Node':
         """Select the child node with the highest combined UCT-RAVE score."""
@@ -77,38 +192,50 @@ def beta_func(child: Node, k=500) -> float:
     """RAVE weight function based on the number of visits to a child node."""
     return k / (k + child.visits)
 
-def mcts(state: np.array, timer_per_move: float, player_number: int, target_depth=3, num_rollouts=10) -> Tuple[int, int]:
-    """Monte Carlo Tree Search with RAVE, including one-step win and block moves."""
+def mcts(state: np.array, timer_per_move: float, player_number: int, target_depth=3, num_rollouts=10, time_manager: TimeManager = None,
+         stats: SearchStats = None, iterations: int = None) -> Tuple[int, int]:
+    """Monte Carlo Tree Search with RAVE, including one-step win and block moves. The time manager, if any, may stop it early,
+    and it stops after `iterations` iterations if given. With `stats`, the iterations are counted and their phases timed."""
     
     opponent = 3 - player_number
-    valid_moves = get_valid_actions(state)
-    
+    winning_moves = get_winning_moves(state)
+
     # Step 1: Check for an immediate winning move
-    for move in valid_moves:
-        new_state = state.copy()
-        new_state[move] = player_number
-        if check_win(new_state, move, player_number)[0]:
-            return move
+    for move in winning_moves[player_number]:
+        return move
 
     # Step 2: Check if the opponent is one step away from winning and block
-    for move in valid_moves:
-        new_state = state.copy()
-        new_state[move] = opponent
-        if check_win(new_state, move, opponent)[0]:
-            return move  # Block the opponent's winning move
+    for move in winning_moves[opponent]:
+        return move  # Block the opponent's winning move
 
     # Step 3: MCTS loop
     root = Node(state=state)
     start_time = time.time()
     max_depth_reached = False
+    done = 0
 
     while time.time() - start_time < timer_per_move and not max_depth_reached:
-        leaf_node, depth = tree_policy(root, player_number)
-        if leaf_node is None:
-            continue
-
-        outcome = rollout(leaf_node, player_number, num_rollouts)
-        backpropagate(leaf_node, outcome)
+        if iterations is not None and done >= iterations:
+            break
+        if time_manager is not None and done % 8 == 0 and done > 0:
+            visits = np.array([child.visits for child in root.children])
+            value = np.array([child.value for child in root.children])
+            if time_manager.should_stop(done, visits, value):
+                break
+        done += 1
+        if stats is None:
+            leaf_node, depth = tree_policy(root, player_number)
+            if leaf_node is None:
+                continue
+            outcome = rollout(leaf_node, player_number, num_rollouts)
+            backpropagate(leaf_node, outcome)
+        else:
+            leaf_node, depth = stats.time('tree_policy', tree_policy, root, player_number)
+            if leaf_node is None:
+                continue
+            outcome = stats.time('rollout', rollout, leaf_node, player_number, num_rollouts, stats)
+            stats.time('backpropagate', backpropagate, leaf_node, outcome)
+            stats.iteration(depth, num_rollouts)
 
         # Update RAVE statistics
         node = leaf_node
@@ -129,7 +256,15 @@ def mcts(state: np.array, timer_per_move: float, player_number: int, target_dept
         if depth >= target_depth:
             max_depth_reached = True
 
-    return root.best_child(c=0.9, beta_func=beta_func).move
+    best = root.best_child(c=0.9, beta_func=beta_func)
+    if stats is not None:
+        nodes = [root]
+        for node in nodes:
+            nodes.extend(node.children)
+        stats.fields.update(tree_size=len(nodes), root_visits=root.visits,
+                            move_visits_share=round(best.visits / max(root.visits, 1), 4),
+                            move_value=round(best.value / max(best.visits, 1), 4))
+    return best.move
 
 def tree_policy(node: Node, player_number: int, current_depth=0, max_depth=3) -> Tuple[Node, int]:
     """Select a leaf node for exploration using UCB1 and track depth."""
@@ -150,59 +285,59 @@ def tree_policy(node: Node, player_number: int, current_depth=0, max_depth=3) ->
 
 def expand(node: Node, player_number: int) -> Node:
     """Expand a node by creating one of its child nodes."""
-    valid_moves = get_valid_actions(node.state)
-    tried_moves = [child.move for child in node.children]
-
-    for move in valid_moves:
-        if move not in tried_moves:
-            new_state = node.state.copy()
-            new_state[move] = player_number
-            return node.add_child(move, new_state)
-    return None
-
-def rollout(node: Node, player_number: int, num_rollouts: int = 10) -> float:
-    """Simulate multiple random games from the current node and return the average outcome."""
+    untried_moves = node.get_untried_moves()
+    if not untried_moves:
+        return None
+
+    move = untried_moves.pop_random()
+    new_state = node.state.copy()
+    new_state[move] = player_number
+    return node.add_child(move, new_state)
+
+def rollout(node: Node, player_number: int, num_rollouts: int = 10, stats: SearchStats = None) -> float:
+    """Simulate multiple random games from the current node and return the average outcome, timing the win checks with `stats`."""
     total_outcome = 0.0
-    
+    tracker = ConnectivityTracker(node.state)
+    tables = get_policy_tables(node.state.shape[0])
+    valid_moves = (node.state == 0).ravel()
+    dim = node.state.shape[0]
+
     for _ in range(num_rollouts):
-        current_state = node.state.copy()
+        current_state = tracker.copy()
+        legal = valid_moves.copy()
+        remaining = int(legal.sum())
         current_player = player_number
         moves_sequence = []
         outcome = None
-        previous_move = None
+        previous_move = -1
 
         while True:
-            moves = get_valid_actions(current_state)
-            if not moves:
+            if remaining == 0:
                 outcome = 0.5
                 break
 
-            # Use LGR if available
-            lgr_move = None
-            if previous_move and previous_move in last_good_reply[current_player]:
-                lgr_move = last_good_reply[current_player][previous_move]
-                if lgr_move in moves:
-                    move = lgr_move
-                else:
-                    move = select_ngram_move(previous_move, moves)
-            else:
-                move = select_ngram_move(previous_move, moves)
-
-            current_state[move] = current_player
-            moves_sequence.append(move)
-            previous_move = move
+            # Use LGR if available, else the N-gram statistics
+            cell = tables.select_move(current_player, previous_move, legal)
+            legal[cell] = False
+            remaining -= 1
+            move = divmod(cell, dim)
+            current_state.play(move, current_player)
+            moves_sequence.append(cell)
+            previous_move = cell
 
             # Check for terminal state
-            if check_win(current_state, move, current_player)[0]:
+            if stats is None:
+                win = current_state.check_win(move, current_player)[0]
+            else:
+                win = stats.time('check_win', current_state.check_win, move, current_player)[0]
+            if win:
                 outcome = 1 if current_player == player_number else 0
                 break
 
             current_player = 3 - current_player  # Switch player
 
-        # Update Last-Good-Reply policy
-        update_lgr(moves_sequence, outcome, player_number)
-        # Update N-gram statistics
-        update_ngram_stats(moves_sequence, outcome, player_number)
+        # Update Last-Good-Reply policy and N-gram statistics
+        tables.update(moves_sequence, outcome, player_number)
 
         total_outcome += outcome if outcome is not None else 0.5  # Handle draws
 
@@ -210,56 +345,6 @@ def rollout(node: Node, player_number: int, num_rollouts: int = 10) -> float:
     # Return the average outcome
     return total_outcome / num_rollouts
 
-
-def select_ngram_move(previous_move: Tuple[int, int], moves: List[Tuple[int, int]], epsilon: float = 0.1) -> Tuple[int, int]:
-    """Select a move using N-gram statistics with epsilon-greedy strategy."""
-    if random.random() < epsilon or not previous_move:
-        return random.choice(moves)
-
-    move_stats = []
-    total_counts = sum(ngram_counts[previous_move][move] for move in moves)
-
-    if total_counts == 0:
-        return random.choice(moves)
-
-    for move in moves:
-        count = ngram_counts[previous_move][move]
-        win = ngram_wins[previous_move][move]
-        win_rate = win / count if count > 0 else 0
-        move_stats.append((win_rate, move))
-
-    # Select the move with the highest win rate
-    _, best_move = max(move_stats)
-    return best_move
-
-def update_lgr(moves_sequence: List[Tuple[int, int]], outcome: float, player_number: int) -> None:
-    """Update the Last-Good-Reply tables based on the outcome of a simulation."""
-    winner = player_number if outcome == 1 else 3 - player_number if outcome == 0 else None
-
-    if winner is not None:
-        for i in range(len(moves_sequence) - 2, -1, -2):  # Iterate over player's moves
-            player = (player_number if (len(moves_sequence) - i) % 2 == 1 else 3 - player_number)
-            opponent_move = moves_sequence[i]
-            reply_move = moves_sequence[i + 1]
-
-            # Update LGR for the winner
-            if player == winner:
-                last_good_reply[player][opponent_move] = reply_move
-            else:
-                # For LGRF-1, forget the last good reply if the player lost
-                if opponent_move in last_good_reply[player]:
-                    del last_good_reply[player][opponent_move]
-
-def update_ngram_stats(moves_sequence: List[Tuple[int, int]], outcome: float, player_number: int) -> None:
-    """Update N-gram statistics based on the moves sequence and outcome."""
-    winner = player_number if outcome == 1 else 3 - player_number if outcome == 0 else None
-    for i in range(len(moves_sequence) - 1):
-        prev_move = moves_sequence[i]
-        curr_move = moves_sequence[i + 1]
-        ngram_counts[prev_move][curr_move] += 1
-        if winner == player_number:
-            ngram_wins[prev_move][curr_move] += 1
-
 def backpropagate(node: Node, outcome: float) -> None:
     """Propagate the result of the simulation back up the tree."""
     while node is not None:
@@ -268,10 +353,6 @@ def backpropagate(node: Node, outcome: float) -> None:
         node = node.parent
         outcome = 1 - outcome
 
-def is_terminal(state: np.array, move: Tuple[int, int]) -> bool:
-    """Check if the current state is terminal (win or draw)."""
-    return check_win(state, move, 1)[0] or check_win(state, move, 2)[0]
-
 class AIPlayer:
 
     def __init__(self, player_number: int, timer):
@@ -289,6 +370,17 @@ class AIPlayer:
         self.type = 'ai'
         self.player_string = 'Player {}: ai'.format(player_number)
         self.timer = timer
+        self.time_manager = TimeManager(timer, player_number)
+        self.stats_writer = None  # Set to a `StatsWriter` to record every search
+        # With `persist_policy`, the playout tables start from `policies/` and are saved back every `save_every` moves
+        # and by `end_game`.
+        # Every save writes the tables of the game so far scaled by `decay`, so that each game fades the statistics
+        # of the older ones once, however many saves it makes.
+        self.persist_policy = False
+        self.save_every = 5
+        self.decay = 0.9
+        self.moves_played = 0
+        self.dim = None
 
     def get_move(self, state: np.array) -> Tuple[int, int]:
         """
@@ -307,7 +399,24 @@ class AIPlayer:
         Tuple[int, int]: action (coordinates of a board cell)
         """
 
-        per_move_time = fetch_remaining_time(self.timer, 1) / (state.shape[0]*10)
-        move = mcts(state, timer_per_move=per_move_time, player_number=self.player_number, target_depth=2**32-1, num_rollouts=10)
+        if self.persist_policy and self.moves_played == 0:
+            load_policy_tables(state.shape[0])
+        self.dim = state.shape[0]
+        per_move_time = self.time_manager.start(state)
+        stats = self.stats_writer.start() if self.stats_writer is not None else None
+        move = mcts(state, timer_per_move=per_move_time, player_number=self.player_number, target_depth=2**32-1, num_rollouts=10, time_manager=self.time_manager,
+                    stats=stats)
+        if stats is not None:
+            self.stats_writer.write(stats, agent='ai2', player=self.player_number, move=[int(move[0]), int(move[1])],
+                                    source='search' if stats.iterations else 'immediate',
+                                    target=round(self.time_manager.target, 6), limit=round(self.time_manager.limit, 6))
+        self.moves_played += 1
+        if self.persist_policy and self.moves_played % self.save_every == 0:
+            get_policy_tables(state.shape[0]).save(policy_path(state.shape[0]), self.decay)
         return (int(move[0]), int(move[1]))
 
+    def end_game(self) -> None:
+        """Saves the playout tables of the moves played since the last save, if they persist."""
+        if self.persist_policy and self.moves_played % self.save_every != 0:
+            get_policy_tables(self.dim).save(policy_path(self.dim), self.decay)
+
@@ -0,0 +1,171 @@
+'''
+Depth-first proof-number search (df-pn), to solve positions exactly instead of sampling them.
+
+Each search proves or disproves that one player, the prover, can force a win. Nodes where the
+prover is to move are OR nodes, the others AND nodes. A position whose win is disproved is
+searched again with the opponent as the prover, to tell a lost position from a drawn one. A position is only expanded after looking for
+immediate wins: a player with a winning move has won, a player facing two winning moves of
+the opponent has lost, and a player facing one must block it, which is then its only move.
+A full board is a draw, which counts as a failure to win.
+'''
+import time
+import numpy as np
+from typing import List, Tuple, Union
+
+from helper import ConnectivityTracker
+
+INFINITY = 10 ** 9
+
+# Results of `ProofNumberSolver.solve`
+WIN, UNKNOWN, DRAW, LOSS = 1, 0, 2, -1
+
+
+class BudgetExceeded(Exception):
+    '''
+    Raised inside the search when its time or node budget runs out
+    '''
+
+
+class ProofNumberSolver:
+    '''
+    Proves or disproves forced wins of `player_num` and of its opponent, keeping its transposition tables between calls
+
+    The table of each prover maps the Zobrist key of a position (which also determines the player to
+    move) to its proof and disproof numbers for that prover. It is cleared once it holds `capacity` positions.
+
+    # Parameters
+    `player_num (int)`: Player to move in the solved positions
+    `capacity (int)`: Most positions kept in the transposition table
+    '''
+
+    def __init__(self, player_num: int, capacity: int = 1 << 20):
+        self.player_num = player_num
+        self.capacity = capacity
+        self.tables = {1: {}, 2: {}}
+        self.prover = player_num
+        self.table = self.tables[player_num]
+        self.nodes = 0
+        self.deadline = None
+        self.max_nodes = None
+
+    def solve(self, board: np.array, seconds: float = None, nodes: int = None) -> Tuple[int, Union[Tuple[int, int], None]]:
+        '''
+        Solves a position where `player_num` is to move, within a time and node budget
+
+        # Parameters
+        `board (numpy array)`: Game board
+        `seconds (float)`: Time budget, unlimited if None
+        `nodes (int)`: Budget of expanded positions, unlimited if None
+
+        # Returns
+        Tuple[int, Union[Tuple[int, int], None]]: `WIN` with a winning move, `LOSS` if the opponent forces
+            a win, `DRAW` if neither player can force a win, or `UNKNOWN` when the budget ran out before
+            the result was proven (possibly after disproving the win of `player_num`)
+        '''
+        state = ConnectivityTracker(board)
+        self.nodes = 0
+        self.deadline = None if seconds is None else time.time() + seconds
+        self.max_nodes = nodes
+        try:
+            proof, disproof = self.prove(state, self.player_num)
+            if disproof == 0:
+                proof, disproof = self.prove(state, 3 - self.player_num)
+                return (LOSS if proof == 0 else DRAW), None
+        except BudgetExceeded:
+            return UNKNOWN, None
+        self.set_prover(self.player_num)
+        wins = state.winning_moves(self.player_num)
+        if wins:
+            return WIN, next(iter(wins))
+        for move, key in self.children(state, self.player_num):
+            if self.lookup(key)[0] == 0:
+                return WIN, move
+        return UNKNOWN, None  # The proof was dropped with the table
+
+    def set_prover(self, prover: int) -> None:
+        self.prover = prover
+        self.table = self.tables[prover]
+
+    def prove(self, state: ConnectivityTracker, prover: int) -> Tuple[int, int]:
+        '''
+        Searches whether `prover` can force a win from the position, where `player_num` is to move,
+        and returns its proof and disproof numbers (one of them 0)
+        '''
+        self.set_prover(prover)
+        return self.search(state, self.player_num, INFINITY, INFINITY)
+
+    def lookup(self, key: int) -> Tuple[int, int]:
+        '''
+        Returns the proof and disproof numbers of a position, (1, 1) if it has not been searched
+        '''
+        return self.table.get(key, (1, 1))
+
+    def store(self, key: int, proof: int, disproof: int) -> None:
+        if len(self.table) >= self.capacity:
+            self.table.clear()
+        self.table[key] = (proof, disproof)
+
+    def children(self, state: ConnectivityTracker, mover: int) -> List[Tuple[Tuple[int, int], int]]:
+        '''
+        Moves worth searching from a position without an immediate win for `mover`, with the keys of the
+        positions they lead to: the forced block if the opponent threatens to win, else every empty cell
+        '''
+        threats = state.winning_moves(3 - mover)
+        if threats:
+            moves = list(threats)[:1] if len(threats) == 1 else []
+        else:
+            moves = [state.geometry.coords[cell] for cell in state.geometry.cells if state.cells[cell] == 0]
+        zobrist = state.geometry.zobrist[mover]
+        index = state.geometry.index
+        return [(move, state.hash ^ zobrist[index(*move)]) for move in moves]
+
+    def search(self, state: ConnectivityTracker, mover: int, proof_threshold: int, disproof_threshold: int) -> Tuple[int, int]:
+        '''
+        Searches the position until its proof number reaches `proof_threshold` or its disproof number
+        reaches `disproof_threshold`, and returns them
+        '''
+        self.nodes += 1
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded()
+        if self.deadline is not None and self.nodes % 64 == 0 and time.time() > self.deadline:
+            raise BudgetExceeded()
+
+        is_or = mover == self.prover
+        if state.winning_moves(mover):
+            proof, disproof = (0, INFINITY) if is_or else (INFINITY, 0)
+            self.store(state.hash, proof, disproof)
+            return proof, disproof
+        children = self.children(state, mover)
+        if not children:
+            # Board full (a draw, never a win), or two threats of the opponent that cannot both be blocked
+            draw = 0 not in state.cells
+            proof, disproof = (INFINITY, 0) if draw or is_or else (0, INFINITY)
+            self.store(state.hash, proof, disproof)
+            return proof, disproof
+
+        while True:
+            numbers = [self.lookup(key) for _, key in children]
+            # Work on the numbers of the player to move: OR nodes minimise proofs, AND nodes disproofs
+            if is_or:
+                proof = min(number[0] for number in numbers)
+                disproof = min(INFINITY, sum(number[1] for number in numbers))
+            else:
+                proof = min(INFINITY, sum(number[0] for number in numbers))
+                disproof = min(number[1] for number in numbers)
+            if proof >= proof_threshold or disproof >= disproof_threshold:
+                self.store(state.hash, proof, disproof)
+                return proof, disproof
+
+            side = 0 if is_or else 1
+            order = sorted(range(len(children)), key=lambda index: numbers[index][side])
+            best = order[0]
+            second = numbers[order[1]][side] if len(order) > 1 else INFINITY
+            if is_or:
+                child_proof = min(proof_threshold, second + 1)
+                child_disproof = disproof_threshold - disproof + numbers[best][1]
+            else:
+                child_proof = proof_threshold - proof + numbers[best][0]
+                child_disproof = min(disproof_threshold, second + 1)
+            child = state.copy()
+            child.play(children[best][0], mover)
+            self.search(child, 3 - mover, min(child_proof, INFINITY), min(child_disproof, INFINITY))
@@ -0,0 +1,99 @@
+import time
+import numpy as np
+from helper import fetch_remaining_time
+
+
+class TimeManager:
+    '''
+    Splits the remaining time of a player over its expected remaining moves, and decides
+    during a search whether to stop before the move's budget or to extend it.
+
+    A move gets a target time, and a limit it may use in critical positions. The search
+    stops before the target once the most visited root move has a lead that the other moves
+    cannot make up in the iterations left, and goes on past the target, up to the limit,
+    while the most visited move is not also the one with the best value.
+
+    # Parameters
+    `timer`: Timer object, as passed to the players (`PLAYER_TIME`)
+    `player_num (int)`: Player whose clock is read
+    `reserve (float)`: Fraction of the remaining time that is never allocated
+    `fill (float)`: Fraction of the empty cells expected to be played before the game ends
+    `min_moves (int)`: Fewest own moves assumed to be left, so that late moves still get a share
+    `extension (float)`: Limit of a move in critical positions, as a multiple of its target
+    `max_share (float)`: Largest fraction of the remaining time a single move may use
+    '''
+
+    def __init__(self, timer, player_num: int, reserve: float = 0.05, fill: float = 0.5,
+                 min_moves: int = 8, extension: float = 2.0, max_share: float = 0.25):
+        self.timer = timer
+        self.player_num = player_num
+        self.reserve = reserve
+        self.fill = fill
+        self.min_moves = min_moves
+        self.extension = extension
+        self.max_share = max_share
+        self.target = self.limit = 0.0
+        self.started = time.time()
+
+    def moves_left(self, board: np.array) -> float:
+        '''
+        Estimates the number of moves the player still has to make
+
+        # Parameters
+        `board (numpy array)`: Current game board
+
+        # Returns
+        float: Expected own moves left, half of the cells expected to be played
+        '''
+        empty = int((board == 0).sum())
+        return max(self.min_moves, self.fill * empty / 2)
+
+    def start(self, board: np.array) -> float:
+        '''
+        Starts the clock of a move and allocates its time
+
+        # Parameters
+        `board (numpy array)`: Current game board
+
+        # Returns
+        float: Time limit of the move in seconds, to be used as the hard budget of the search
+        '''
+        self.started = time.time()
+        remaining = fetch_remaining_time(self.timer, self.player_num) * (1 - self.reserve)
+        self.target = remaining / self.moves_left(board)
+        self.limit = min(self.target * self.extension, remaining * self.max_share)
+        self.target = min(self.target, self.limit)
+        return self.limit
+
+    def elapsed(self) -> float:
+        '''
+        Returns the time spent on the current move
+        '''
+        return time.time() - self.started
+
+    def should_stop(self, iterations: int, visits: np.array, value: np.array) -> bool:
+        '''
+        Whether the search of the current move can stop now
+
+        # Parameters
+        `iterations (int)`: Iterations done by the search of this move so far
+        `visits (numpy array)`: Visits of every root move
+        `value (numpy array)`: Summed value of every root move, for the player to move
+
+        # Returns
+        bool: True once the most visited move cannot be overtaken before the target, or past
+            the target when it also has the best value among the well visited moves
+        '''
+        elapsed = self.elapsed()
+        if elapsed >= self.limit or len(visits) < 2:
+            return True
+        best = int(np.argmax(visits))
+        if elapsed < self.target:
+            # Every iteration adds at most one visit to one move
+            second = np.partition(visits, -2)[-2]
+            rate = iterations / max(elapsed, 1e-6)
+            return visits[best] - second > rate * (self.target - elapsed)
+        # Moves with too few visits for their value to mean much are left out
+        contenders = visits * 10 >= visits[best]
+        means = np.where(contenders, value / np.maximum(visits, 1), -np.inf)
+        return means[best] >= means.max()